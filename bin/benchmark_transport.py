@@ -0,0 +1,74 @@
+"""
+Compares the per request overhead of the transport backends.
+
+Every backend sends the same GET (with query parameters, a bearer token and a
+small JSON body in the response) to a local keep-alive server, so the network
+is out of the picture and the difference between backends is client overhead.
+
+    python bin/benchmark_transport.py [--requests 5000]
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from devices.session import new_session
+from devices.transport import BACKENDS, Transport
+
+BODY = json.dumps({
+    "after": None,
+    "count": 1,
+    "total": 1,
+    "data": [{
+        "id": "9c9a7ce5b2fca4658633800bf9cd9d6e"
+    }],
+}).encode()
+PARAMS = {"customerId": "9a919a42-b506-49ee-b053-402827b761b7", "limit": 100, "sortby": "+serial_number"}
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *_):  # pylint: disable=arguments-differ
+        pass
+
+
+def run(backend, url, requests):
+    transport = Transport(BACKENDS[backend](new_session("aRandomBearerToken")))
+    for _ in range(100):  # warm up connections and caches
+        transport.request("GET", url, params=PARAMS).json()
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        transport.request("GET", url, params=PARAMS).json()
+    return (time.perf_counter() - start) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/v2/devices"
+
+    results = {backend: run(backend, url, args.requests) for backend in BACKENDS}
+    baseline = results["requests"]
+    for backend, seconds in results.items():
+        print(f"{backend:>10}: {seconds * 1e6:8.1f} us/request ({seconds / baseline:.2f}x the requests backend)")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -3,12 +3,40 @@ from requests.auth import AuthBase
 
 
 class Auth0Bearer(AuthBase):
+    """
+    Bearer authentication with either a static token or a token provider.
+
+    A token provider is any object with a ``token`` attribute (e.g. an
+    ``Auth0Client``), read on every request so rotated tokens are picked up.
+    Providers that also implement ``invalidate(stale_token)`` can be asked
+    for a new token when the API rejects the current one.
+    """
 
     def __init__(self, token):
-        self.token = token
+        self._token = token
         if not token:
             raise InvalidTokenError("No token set to query API-devices")
 
+    @property
+    def provider(self):
+        return None if isinstance(self._token, str) else self._token
+
+    @property
+    def token(self):
+        return self._token if isinstance(self._token, str) else self._token.token
+
+    def refresh(self, stale_token=None):
+        """
+        Drops ``stale_token`` so the provider fetches a new one. Returns False
+        when the token cannot be refreshed.
+        """
+        invalidate = getattr(self._token, "invalidate", None)
+        if invalidate is None:
+            return False
+
+        invalidate(stale_token)
+        return True
+
     def __call__(self, r):
         r.headers["Authorization"] = f"Bearer {self.token}"
         return r
@@ -1,57 +1,351 @@
+import asyncio
+import random
+import threading
+import weakref
 from datetime import datetime, timedelta
+from urllib.parse import urlsplit
 
 import requests
 
+from devices.metrics import Metrics, measure
+from devices.session import DEFAULT_TIMEOUT, warm_up
 #from proxy_flare.settings import (
 from devices.settings import (
     AUTH0_AUDIENCE,
     AUTH0_CLIENT_ID,
     AUTH0_CLIENT_SECRET,
     AUTH0_GRANT_TYPE,
+    AUTH0_REFRESH_AHEAD_JITTER,
+    AUTH0_REFRESH_AHEAD_RATIO,
+    AUTH0_TOKEN_STORE_ENABLED,
+    AUTH0_TOKEN_STORE_PATH,
     AUTH0_URL,
 )
-#from proxy_flare.utils import timed_request
-from devices.utils import timed_request
+from devices.token_store import FileTokenStore, StoredToken
+from devices.tracing import NOOP_TRACER, Tracer
+from devices.utils import logger
 
+DEFAULT_TOKEN_STORE = FileTokenStore(AUTH0_TOKEN_STORE_PATH) if AUTH0_TOKEN_STORE_ENABLED else None
 
-class Auth0Client:
-    _singleton = None
-    _access_token = None
-    _expiration_date = None
 
-    def __new__(cls, *args, **kwargs):
-        if not cls._singleton:
-            cls._singleton = object.__new__(Auth0Client)
-        return cls._singleton
+class Auth0Client:  # pylint: disable=too-many-instance-attributes
+    refresh_ahead_ratio = AUTH0_REFRESH_AHEAD_RATIO
+    refresh_ahead_jitter = AUTH0_REFRESH_AHEAD_JITTER
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        url=AUTH0_URL,
+        client_id=AUTH0_CLIENT_ID,
+        client_secret=AUTH0_CLIENT_SECRET,
+        audience=AUTH0_AUDIENCE,
+        grant_type=AUTH0_GRANT_TYPE,
+        session=None,
+        token_store=DEFAULT_TOKEN_STORE,
+        metrics: Metrics = None,
+        tracer: Tracer = None,
+        timeout=DEFAULT_TIMEOUT,
+    ):
+        self.base_url = url
+        self.client_id = client_id
+        self.audience = audience
+        self._client_secret = client_secret
+        self._grant_type = grant_type
+        self._owns_session = session is None
+        self._session = session or requests.Session()
+        self.token_store = token_store
+        self.metrics = metrics
+        self.tracer = tracer or NOOP_TRACER
+        # Token requests hold the refresh lock (and the token store lock), they must not hang
+        self.timeout = timeout
+
+        self._access_token = None
+        self._expiration_date = None
+        self._issued_at = None
+        self._expires_in = None
+
+        # Only one refresh may be in flight, other callers wait for it
+        self._refresh_lock = threading.Lock()
+        self._async_locks = weakref.WeakKeyDictionary()
+        self._refresh_timer = None
+        self._counters_lock = threading.Lock()
+        self._counters = dict(requested=0, failed=0, from_store=0)
+
+    def stats(self):
+        """
+        Tokens ``requested`` to Auth0 (refreshes included), requests that
+        ``failed`` and tokens taken ``from_store``.
+        """
+        with self._counters_lock:
+            return dict(self._counters)
+
+    def _count(self, counter):
+        with self._counters_lock:
+            self._counters[counter] += 1
 
     def _token_is_valid(self):
         return not (self._access_token is None or self._expiration_date is None) \
                and self._expiration_date > datetime.now()  # and not DEBUG
 
-    @timed_request
     def _request_token(self):
+        self._count("requested")
+        with self.tracer.span("auth0.token", {"auth0.audience": self.audience}):
+            try:
+                return self._post_token_request()
+            except Exception:
+                self._count("failed")
+                raise
+
+    def _post_token_request(self):
         start_time = datetime.now()
 
         # Make the Auth0 Post
-        url = AUTH0_URL
+        url = self.base_url
         payload = {
-            'grant_type': AUTH0_GRANT_TYPE,
-            'client_id': AUTH0_CLIENT_ID,
-            'client_secret': AUTH0_CLIENT_SECRET,
-            'audience': AUTH0_AUDIENCE
+            'grant_type': self._grant_type,
+            'client_id': self.client_id,
+            'client_secret': self._client_secret,
+            'audience': self.audience
         }
-        response = requests.post(url, data=payload)
+        headers = self.tracer.inject({})
+        if self.metrics is None:
+            response = self._session.post(url, data=payload, headers=headers, timeout=self.timeout)
+        else:
+            endpoint = urlsplit(url).path or url
+            response = measure(
+                self.metrics,
+                endpoint,
+                "POST",
+                lambda: self._session.post(url, data=payload, headers=headers, timeout=self.timeout),
+            )
 
         if response.ok:
             parsed_response = response.json()
             self._access_token = parsed_response.get('access_token', None)
 
             expires_in = parsed_response.get('expires_in', 86400)
-            self._expiration_date = start_time + timedelta(seconds=expires_in)
+            self._set_token(self._access_token, start_time, expires_in)
             return self._access_token
         else:
             raise Exception('Failed to get Auth0 Token')
 
+    def _set_token(self, access_token, issued_at, expires_in):
+        self._access_token = access_token
+        self._expiration_date = issued_at + timedelta(seconds=expires_in)
+        self._issued_at = issued_at
+        self._expires_in = expires_in
+        self._schedule_refresh()
+
+    @property
+    def key(self):
+        return self.base_url, self.client_id, self.audience
+
+    def _token_store_key(self):
+        return "|".join(self.key)
+
+    def _fetch_token(self, newer_than=None):
+        """
+        Takes the token from the token store when it holds a valid one (issued
+        after ``newer_than``, if given), and requests a new one otherwise.
+        """
+        store = self.token_store
+        if store is None:
+            return self._request_token()
+
+        key = self._token_store_key()
+        with store.lock(key):
+            stored = store.load(key)
+            if stored is not None and stored.is_valid() and (newer_than is None or stored.issued_at > newer_than):
+                self._set_token(stored.access_token, datetime.fromtimestamp(stored.issued_at), stored.expires_in)
+                self._count("from_store")
+                return self._access_token
+
+            access_token = self._request_token()
+            try:
+                store.save(key, StoredToken(access_token, self._issued_at.timestamp(), self._expires_in))
+            except OSError:
+                logger.exception("Failed to save the Auth0 token in the token store")
+            return access_token
+
+    def enable_refresh_ahead(self, ratio=0.75, jitter=0.1):
+        """
+        Renew the token in the background once ``ratio`` of its lifetime has
+        passed, so callers never wait for Auth0 while the token is renewed.
+        Each renewal is brought forward by a random fraction (up to ``jitter``)
+        of that delay to avoid every process renewing at the same time.
+        """
+        if not 0 < ratio < 1:
+            raise ValueError("ratio must be between 0 and 1")
+
+        self.refresh_ahead_ratio = ratio
+        self.refresh_ahead_jitter = jitter
+        self._schedule_refresh()
+
+    def disable_refresh_ahead(self):
+        self.refresh_ahead_ratio = 0
+        self._cancel_refresh()
+
+    def _cancel_refresh(self):
+        timer, self._refresh_timer = self._refresh_timer, None
+        if timer is not None:
+            timer.cancel()
+
+    def _schedule_refresh(self, delay=None):
+        self._cancel_refresh()
+        if not self.refresh_ahead_ratio or self._issued_at is None:
+            return
+
+        if delay is None:
+            delay = self._expires_in * self.refresh_ahead_ratio
+            delay -= delay * self.refresh_ahead_jitter * random.random()
+            delay -= (datetime.now() - self._issued_at).total_seconds()
+
+        # The timer only holds a weak reference, so it does not keep a dropped client alive
+        timer = threading.Timer(max(delay, 0), _refresh_in_background, args=(weakref.ref(self),))
+        timer.daemon = True
+        self._refresh_timer = timer
+        timer.start()
+
+    def _refresh_in_background(self):
+        with self._refresh_lock:
+            try:
+                self._fetch_token(newer_than=self._issued_at.timestamp())
+            except Exception:  # pylint: disable=broad-except
+                # Keep serving the current token, and try again halfway to its expiration
+                remaining = (self._expiration_date - datetime.now()).total_seconds()
+                logger.exception("Failed to refresh the Auth0 token in the background")
+                if remaining > 1:
+                    self._schedule_refresh(delay=remaining / 2)
+
+    def close(self):
+        """
+        Stops refreshing the token ahead and closes the session, unless it was given.
+        """
+        self.disable_refresh_ahead()
+        if self._owns_session:
+            self._session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def warm_up(self, connections=1, background=False):
+        """
+        Opens ``connections`` to the token endpoint ahead of the first token request.
+        """
+        return warm_up(self._session, self.base_url, connections=connections, background=background)
+
+    def _async_lock(self):
+        loop = asyncio.get_running_loop()
+        lock = self._async_locks.get(loop)
+        if lock is None:
+            lock = self._async_locks[loop] = asyncio.Lock()
+        return lock
+
     @property
     def token(self):
-        return self._access_token if self._token_is_valid() else self._request_token()
+        if self._token_is_valid():
+            return self._access_token
+
+        with self._refresh_lock:
+            # The token may have been refreshed while waiting for the lock
+            if self._token_is_valid():
+                return self._access_token
+            return self._fetch_token()
+
+    def invalidate(self, stale_token=None):
+        """
+        Replaces a token rejected by the API. Nothing is done when
+        ``stale_token`` was already replaced by another caller, so concurrent
+        rejections of the same token only trigger one refresh.
+        """
+        with self._refresh_lock:
+            if self._access_token is None or stale_token not in (None, self._access_token):
+                return
+
+            # The token store may still hold the rejected token, only take newer ones from it
+            self._fetch_token(newer_than=self._issued_at.timestamp())
+
+    async def get_token(self):
+        """
+        Asyncio counterpart of ``token``.
+
+        Coroutines of the same event loop wait on each other without blocking
+        the loop, and the refresh itself runs in the default executor, where it
+        is serialized with the threads going through ``token``.
+        """
+        if self._token_is_valid():
+            return self._access_token
+
+        async with self._async_lock():
+            if self._token_is_valid():
+                return self._access_token
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, lambda: self.token)
+
+
+def _refresh_in_background(client_ref):
+    auth0_client = client_ref()
+    if auth0_client is not None:
+        auth0_client._refresh_in_background()  # pylint: disable=protected-access
+
+
+class Auth0TokenManager:
+    """
+    Hands out one ``Auth0Client`` per (url, client_id, audience), so tokens for
+    several tenants, audiences or environments can live in the same process.
+    Every client shares the manager's pooled session to the token endpoints.
+    """
+
+    def __init__(self, session=None, token_store=DEFAULT_TOKEN_STORE, metrics: Metrics = None, tracer: Tracer = None):
+        self._session = session or requests.Session()
+        self._token_store = token_store
+        self._metrics = metrics
+        self._tracer = tracer
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        return self._session
+
+    def client(
+        self,
+        client_id=AUTH0_CLIENT_ID,
+        client_secret=AUTH0_CLIENT_SECRET,
+        audience=AUTH0_AUDIENCE,
+        url=AUTH0_URL,
+    ) -> Auth0Client:
+        key = (url, client_id, audience)
+        with self._lock:
+            auth0_client = self._clients.get(key)
+            if auth0_client is None:
+                auth0_client = self._clients[key] = Auth0Client(
+                    url=url,
+                    client_id=client_id,
+                    client_secret=client_secret,
+                    audience=audience,
+                    session=self._session,
+                    token_store=self._token_store,
+                    metrics=self._metrics,
+                    tracer=self._tracer,
+                )
+            return auth0_client
+
+    def token(self, **kwargs):
+        return self.client(**kwargs).token
+
+    def close(self):
+        with self._lock:
+            clients, self._clients = list(self._clients.values()), {}
+        for auth0_client in clients:
+            auth0_client.close()
+        self._session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
@@ -0,0 +1,63 @@
+import threading
+import time
+
+
+class NegativeCache:
+    """
+    Short lived cache for "not found" results.
+
+    Entries expire ``ttl`` seconds after being stored. When ``maxsize`` is
+    reached the oldest entry is evicted to make room for the new one.
+    """
+
+    def __init__(self, ttl=30, maxsize=10000, clock=time.monotonic):
+        self._ttl = ttl
+        self._maxsize = maxsize
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def ttl(self):
+        return self._ttl
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+
+            expires_at, value = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                self._misses += 1
+                return None
+
+            self._hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries.pop(key, None)
+            if len(self._entries) >= self._maxsize:
+                del self._entries[next(iter(self._entries))]
+            self._entries[key] = (self._clock() + self._ttl, value)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "size": len(self._entries),
+            }
@@ -0,0 +1,138 @@
+import threading
+import time
+from enum import Enum
+
+from devices.errors import CircuitOpenError
+
+
+class CircuitState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __str__(self):
+        return self.value
+
+
+class _Circuit:
+
+    def __init__(self):
+        self.state = CircuitState.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.probes = 0
+        self.probe_successes = 0
+        self.opened = 0
+        self.rejected = 0
+
+
+class CircuitBreaker:
+    """
+    Per endpoint circuit breaker.
+
+    A circuit opens after ``failure_threshold`` consecutive failures (server
+    errors, connection errors, timeouts and, when ``slow_call_threshold`` is
+    set, calls slower than it in seconds) and rejects calls with
+    ``CircuitOpenError`` for ``recovery_timeout`` seconds. It then half-opens:
+    up to ``half_open_probes`` calls go through and the circuit closes when
+    all of them succeed, or opens again on the first failure.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        failure_threshold=5,
+        recovery_timeout=30,
+        half_open_probes=1,
+        slow_call_threshold=None,
+        clock=time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_probes = half_open_probes
+        self.slow_call_threshold = slow_call_threshold
+        self._clock = clock
+        self._circuits = {}
+        self._lock = threading.Lock()
+
+    @property
+    def clock(self):
+        return self._clock
+
+    def _circuit(self, endpoint):
+        return self._circuits.setdefault(str(endpoint), _Circuit())
+
+    def state(self, endpoint):
+        with self._lock:
+            circuit = self._circuits.get(str(endpoint))
+            return circuit.state if circuit is not None else CircuitState.CLOSED
+
+    def stats(self):
+        """
+        State of every endpoint seen so far: ``state``, consecutive
+        ``failures``, times it ``opened`` and calls ``rejected`` while open.
+        """
+        with self._lock:
+            return {
+                endpoint: dict(
+                    state=circuit.state.value,
+                    failures=circuit.failures,
+                    opened=circuit.opened,
+                    rejected=circuit.rejected,
+                ) for endpoint, circuit in self._circuits.items()
+            }
+
+    def allow(self, endpoint):
+        """
+        Raises ``CircuitOpenError`` when a call to ``endpoint`` must fail fast.
+        """
+        with self._lock:
+            circuit = self._circuit(endpoint)
+            if circuit.state == CircuitState.OPEN:
+                retry_in = circuit.opened_at + self.recovery_timeout - self._clock()
+                if retry_in > 0:
+                    circuit.rejected += 1
+                    raise CircuitOpenError(f"Circuit for {endpoint} is open, retry in {retry_in:.1f}s")
+                circuit.state = CircuitState.HALF_OPEN
+                circuit.probes = 0
+                circuit.probe_successes = 0
+
+            if circuit.state == CircuitState.HALF_OPEN:
+                if circuit.probes >= self.half_open_probes:
+                    circuit.rejected += 1
+                    raise CircuitOpenError(f"Circuit for {endpoint} is half open, waiting for probes")
+                circuit.probes += 1
+
+    def release(self, endpoint):
+        """
+        Gives back the half open probe taken by ``allow`` for a call that
+        ended without an outcome telling anything about the endpoint.
+        """
+        with self._lock:
+            circuit = self._circuit(endpoint)
+            if circuit.state == CircuitState.HALF_OPEN and circuit.probes > 0:
+                circuit.probes -= 1
+
+    def record(self, endpoint, success, latency=None):
+        """
+        Records the outcome of a call allowed by ``allow``.
+        """
+        if success and self.slow_call_threshold is not None and latency is not None:
+            success = latency < self.slow_call_threshold
+
+        with self._lock:
+            circuit = self._circuit(endpoint)
+            if success:
+                circuit.failures = 0
+                if circuit.state == CircuitState.HALF_OPEN:
+                    circuit.probe_successes += 1
+                    if circuit.probe_successes >= self.half_open_probes:
+                        circuit.state = CircuitState.CLOSED
+                return
+
+            circuit.failures += 1
+            if circuit.state == CircuitState.HALF_OPEN or circuit.failures >= self.failure_threshold:
+                if circuit.state != CircuitState.OPEN:
+                    circuit.opened += 1
+                circuit.state = CircuitState.OPEN
+                circuit.opened_at = self._clock()
@@ -0,0 +1,78 @@
+import threading
+
+from devices.errors import DeadlineExceededError
+
+
+class _Call:  # pylint: disable=too-few-public-methods
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls sharing the same key into a single execution.
+
+    The first caller for a key runs the function, every other caller arriving
+    while it is still in flight waits for it and gets the same result (or
+    exception). Once the call finishes the key is forgotten, so this is not a
+    cache: a later call will execute again.
+
+    Waiting callers give up with ``DeadlineExceededError`` when their own
+    ``deadline`` expires before the call finishes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._executed = 0
+        self._coalesced = 0
+
+    @property
+    def executed(self):
+        return self._executed
+
+    @property
+    def coalesced(self):
+        return self._coalesced
+
+    def stats(self):
+        with self._lock:
+            return {
+                "executed": self._executed,
+                "coalesced": self._coalesced,
+                "in_flight": len(self._calls),
+            }
+
+    def do(self, key, fn, deadline=None):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self._coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self._executed += 1
+                leader = True
+
+        if not leader:
+            if not call.done.wait(deadline.remaining() if deadline is not None else None):
+                deadline.check()
+                raise DeadlineExceededError(f"Operation did not finish within its {deadline.seconds}s deadline")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as err:
+            call.error = err
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
@@ -0,0 +1,55 @@
+import threading
+
+from urllib3.util.request import ACCEPT_ENCODING as SUPPORTED_ENCODINGS
+
+# Brotli is only offered when urllib3 can decode it (brotli or brotlicffi installed)
+ACCEPT_ENCODING = "gzip, br" if "br" in SUPPORTED_ENCODINGS else "gzip"
+
+
+def wire_bytes(response):
+    """
+    Size of the body of ``response`` as received, before decompression.
+    """
+    raw = response.raw
+    if raw is not None and hasattr(raw, "tell"):
+        return raw.tell()
+
+    # Adapters that do not expose the raw stream (e.g. HTTP/2) keep the header of the encoded body
+    content_length = response.headers.get("Content-Length")
+    return int(content_length) if content_length else len(response.content)
+
+
+def _ratio(counters):
+    compressed = counters["compressed_bytes"]
+    return counters["uncompressed_bytes"] / compressed if compressed else None
+
+
+class CompressionStats:
+    """
+    Compressed (on the wire) vs uncompressed body bytes received per endpoint.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def record(self, endpoint, response):
+        compressed = wire_bytes(response)
+        uncompressed = len(response.content)
+        encoding = response.headers.get("Content-Encoding", "identity")
+        with self._lock:
+            counters = self._endpoints.setdefault(
+                str(endpoint),
+                dict(responses=0, compressed_responses=0, compressed_bytes=0, uncompressed_bytes=0),
+            )
+            counters["responses"] += 1
+            counters["compressed_responses"] += encoding != "identity"
+            counters["compressed_bytes"] += compressed
+            counters["uncompressed_bytes"] += uncompressed
+
+    def stats(self):
+        """
+        Counters per endpoint, with the ``ratio`` of uncompressed to compressed bytes.
+        """
+        with self._lock:
+            return {endpoint: dict(counters, ratio=_ratio(counters)) for endpoint, counters in self._endpoints.items()}
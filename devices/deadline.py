@@ -0,0 +1,45 @@
+import time
+
+from devices.errors import DeadlineExceededError
+
+
+class Deadline:
+    """
+    Time budget for a whole operation: every request, retry and page it
+    involves is given the time left instead of a fresh timeout.
+    """
+
+    def __init__(self, seconds, clock=time.monotonic):
+        self._seconds = seconds
+        self._clock = clock
+        self._expires_at = clock() + seconds
+
+    @property
+    def seconds(self):
+        return self._seconds
+
+    def remaining(self):
+        return max(self._expires_at - self._clock(), 0)
+
+    @property
+    def expired(self):
+        return self.remaining() <= 0
+
+    def check(self):
+        if self.expired:
+            raise DeadlineExceededError(f"Operation did not finish within its {self._seconds}s deadline")
+
+    def timeout(self, timeout=None):
+        """
+        Caps a ``requests`` timeout (seconds or a (connect, read) tuple) to the
+        time left. Raises ``DeadlineExceededError`` when there is no time left.
+        """
+        self.check()
+        remaining = self.remaining()
+        if timeout is None:
+            return remaining
+
+        if isinstance(timeout, tuple):
+            return tuple(remaining if value is None else min(value, remaining) for value in timeout)
+
+        return min(timeout, remaining)
@@ -4,3 +4,15 @@ class InvalidTokenError(Exception):
 
 class InvalidParamsError(Exception):
     pass
+
+
+class RequestTimeoutError(Exception):
+    pass
+
+
+class DeadlineExceededError(RequestTimeoutError):
+    pass
+
+
+class CircuitOpenError(Exception):
+    pass
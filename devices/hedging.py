@@ -0,0 +1,116 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from devices.retry import RetryBudget
+
+
+class HedgingPolicy:  # pylint: disable=too-many-instance-attributes
+    """
+    Hedges slow idempotent requests: when no response arrived after the
+    ``percentile`` latency of the last ``window`` requests to the endpoint
+    (``initial_delay`` until ``min_samples`` are known), an identical request is
+    sent and whichever finishes first is used. The other one is cancelled if it
+    did not start yet, or its response is closed when it arrives.
+
+    Hedges are capped to ``max_extra_load`` (a fraction) of the requests, with
+    a budget shared the same way as retries are. Both attempts run on a pool
+    of ``max_workers`` threads, size it to about twice the number of threads
+    sharing the policy.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        percentile=95,
+        initial_delay=1.0,
+        min_delay=0.01,
+        min_samples=20,
+        window=200,
+        max_extra_load=0.1,
+        max_workers=32,
+        clock=time.monotonic,
+    ):
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.window = window
+        self.budget = RetryBudget(ratio=max_extra_load, max_tokens=max(1, min_samples * max_extra_load))
+        self._clock = clock
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedging")
+        self._latencies = {}
+        self._lock = threading.Lock()
+        self._counters = dict(requests=0, hedged=0, hedge_wins=0, budget_exhausted=0)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters)
+
+    def delay(self, endpoint):
+        """
+        Seconds to wait for a response from ``endpoint`` before hedging.
+        """
+        with self._lock:
+            latencies = sorted(self._latencies.get(str(endpoint), ()))
+        if len(latencies) < self.min_samples:
+            return self.initial_delay
+        index = min(len(latencies) - 1, int(len(latencies) * self.percentile / 100))
+        return max(latencies[index], self.min_delay)
+
+    def _timed(self, endpoint, send):
+        started_at = self._clock()
+        result = send()
+        with self._lock:
+            latencies = self._latencies.setdefault(str(endpoint), deque(maxlen=self.window))
+            latencies.append(self._clock() - started_at)
+        return result
+
+    def _can_hedge(self):
+        hedge = self.budget.withdraw()
+        with self._lock:
+            self._counters["hedged" if hedge else "budget_exhausted"] += 1
+        return hedge
+
+    @staticmethod
+    def _discard(future):
+
+        def close(loser):
+            if loser.exception() is None:
+                loser.result().close()
+
+        if not future.cancel():
+            future.add_done_callback(close)
+
+    def call(self, endpoint, send):
+        """
+        Calls ``send`` (returning a ``requests.Response``), hedging it when slow.
+        """
+        with self._lock:
+            self._counters["requests"] += 1
+        self.budget.deposit()
+
+        primary = self._executor.submit(self._timed, endpoint, send)
+        done, _ = wait([primary], timeout=self.delay(endpoint))
+        if done or not self._can_hedge():
+            return primary.result()
+
+        hedge = self._executor.submit(self._timed, endpoint, send)
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            winner = next((future for future in done if future.exception() is None), None)
+            if winner is not None:
+                for loser in pending:
+                    self._discard(loser)
+                if winner is hedge:
+                    with self._lock:
+                        self._counters["hedge_wins"] += 1
+                return winner.result()
+
+        # Both attempts failed
+        return primary.result()
+
+    def close(self):
+        self._executor.shutdown(wait=False)
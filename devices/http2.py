@@ -0,0 +1,129 @@
+import threading
+from collections import Counter
+
+from requests.adapters import DEFAULT_POOLSIZE, BaseAdapter
+from requests.exceptions import ConnectionError as RequestsConnectionError
+from requests.exceptions import ConnectTimeout, ReadTimeout
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers, select_proxy
+from urllib3.util import parse_url
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    httpx = None
+
+# Connection specific headers are not allowed in HTTP/2 requests
+_HOP_BY_HOP_HEADERS = frozenset({"connection", "keep-alive", "proxy-connection", "transfer-encoding", "upgrade"})
+
+
+class HTTP2Adapter(BaseAdapter):
+    """
+    ``requests`` transport adapter sending requests over HTTP/2 with ``httpx``
+    (installed with the ``http2`` extra), so concurrent requests to the same
+    host are multiplexed over a few connections instead of one each.
+
+    ``http://`` URLs use HTTP/2 with prior knowledge (h2c), ``https://`` ones
+    negotiate it through ALPN and fall back to HTTP/1.1 when unsupported.
+    The ``verify`` setting of the session is honoured, client certificates
+    and proxies are not supported.
+    """
+
+    def __init__(self, max_connections=DEFAULT_POOLSIZE, verify=True):
+        if httpx is None:
+            raise ImportError("HTTP/2 support needs httpx, install api-devices-client[http2]")
+
+        super().__init__()
+        self._limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self._client = httpx.Client(http1=False, http2=True, limits=self._limits)
+        # TLS clients by ``verify`` setting, as httpx checks certificates per client
+        self._tls_clients = {verify: httpx.Client(http2=True, verify=verify, limits=self._limits)}
+        self._tls_lock = threading.Lock()
+        self._requests = Counter()
+
+    def _tls_client(self, verify):
+        with self._tls_lock:
+            if verify not in self._tls_clients:
+                self._tls_clients[verify] = httpx.Client(http2=True, verify=verify, limits=self._limits)
+            return self._tls_clients[verify]
+
+    @staticmethod
+    def _timeout(timeout):
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            return httpx.Timeout(read, connect=connect)
+        return httpx.Timeout(timeout)
+
+    # pylint: disable=too-many-arguments
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        if cert is not None:
+            raise ValueError("Client certificates are not supported over HTTP/2")
+        if select_proxy(request.url, proxies):
+            raise ValueError(f"Proxies are not supported over HTTP/2, no proxy should be set for {request.url}")
+
+        client = self._tls_client(verify) if request.url.startswith("https://") else self._client
+        headers = [(name, value) for name, value in request.headers.items() if name.lower() not in _HOP_BY_HOP_HEADERS]
+        url = parse_url(request.url)
+        self._requests[f"{url.scheme}://{url.host}:{url.port or (443 if url.scheme == 'https' else 80)}"] += 1
+        try:
+            response = client.request(
+                request.method,
+                request.url,
+                content=request.body,
+                headers=headers,
+                timeout=self._timeout(timeout),
+            )
+        except httpx.ConnectTimeout as err:
+            raise ConnectTimeout(err, request=request)
+        except httpx.TimeoutException as err:
+            raise ReadTimeout(err, request=request)
+        except httpx.TransportError as err:
+            raise RequestsConnectionError(err, request=request)
+
+        return self.build_response(request, response)
+
+    def build_response(self, request, http2_response):
+        response = Response()
+        response.status_code = http2_response.status_code
+        response.headers = CaseInsensitiveDict(http2_response.headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.reason = http2_response.reason_phrase
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response.http_version = http2_response.http_version
+        # The body has already been read (and decoded) by httpx
+        response._content = http2_response.content  # pylint: disable=protected-access
+        response._content_consumed = True  # pylint: disable=protected-access
+        return response
+
+    def pool_stats(self):
+        """
+        Connections of the adapter keyed by origin, in the format of ``devices.session.pool_stats``.
+        """
+        # pylint: disable=protected-access
+        stats = {}
+        with self._tls_lock:
+            clients = [self._client, *self._tls_clients.values()]
+        for client in clients:
+            pool = getattr(client._transport, "_pool", None)
+            for connection in getattr(pool, "connections", []):
+                origin = connection._origin
+                key = f"{origin.scheme.decode()}://{origin.host.decode()}:{origin.port}"
+                entry = stats.setdefault(
+                    key,
+                    dict(maxsize=pool._max_connections, in_use=0, idle=0, connections=0, requests=self._requests[key]),
+                )
+                entry["connections"] += 1
+                if connection.is_idle():
+                    entry["idle"] += 1
+                else:
+                    entry["in_use"] += 1
+        return stats
+
+    def close(self):
+        self._client.close()
+        with self._tls_lock:
+            for client in self._tls_clients.values():
+                client.close()
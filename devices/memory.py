@@ -0,0 +1,99 @@
+import sys
+import threading
+import tracemalloc
+import types
+from enum import Enum
+
+from devices.metrics import MemorySample
+
+
+def deep_sizeof(obj):
+    """
+    Estimate of the memory taken by ``obj`` and everything it references
+    through containers and instance attributes, shared objects counted once.
+    """
+    seen = set()
+    size = 0
+    pending = [obj]
+    while pending:
+        obj = pending.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        if isinstance(obj, (type, types.ModuleType, types.FunctionType, Enum)):
+            # Shared by every object, not taken by this one
+            continue
+        size += sys.getsizeof(obj)
+        if isinstance(obj, (str, bytes, bytearray, int, float, bool, type(None))):
+            continue
+        if isinstance(obj, dict):
+            pending.extend(obj.keys())
+            pending.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            pending.extend(obj)
+        if hasattr(obj, "__dict__"):
+            pending.append(vars(obj))
+        for slot in getattr(type(obj), "__slots__", ()):
+            if hasattr(obj, slot):
+                pending.append(getattr(obj, slot))
+    return size
+
+
+class MemoryAccounting:
+    """
+    Opt-in accounting of the memory taken by the responses of queries, per
+    page and customer: the size of the body, an estimate of the decoded JSON
+    and the size retained by the loaded objects (``Device`` pages, ...).
+    Samples go to ``on_sample`` and to the ``Metrics`` of the client.
+
+    Sizes are estimated by walking the objects. In ``debug`` mode the retained
+    size is measured with ``tracemalloc`` instead (started if needed, which
+    slows the whole process down): the memory still allocated once the
+    objects are loaded, the decoded JSON excluded.
+    """
+
+    def __init__(self, debug=False, on_sample=None):
+        self.debug = debug
+        self.on_sample = on_sample
+        self._started_tracemalloc = False
+        self._tracemalloc_lock = threading.Lock()
+        if debug and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+    def close(self):
+        """
+        Stops ``tracemalloc`` when it was started by this accounting.
+        """
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    # pylint: disable=too-many-arguments
+    def load(self, response, load, data, endpoint, customer_id, hooks=()):
+        """
+        Loads the decoded ``data`` of ``response`` with ``load`` and reports
+        the memory taken to ``on_sample`` and ``hooks``.
+        """
+        decoded = deep_sizeof(data)
+        if self.debug and tracemalloc.is_tracing():
+            # Concurrent loads would be counted in each other's retained size
+            with self._tracemalloc_lock:
+                before = tracemalloc.get_traced_memory()[0]
+                result = load(data)
+                retained = max(tracemalloc.get_traced_memory()[0] - before, 0)
+        else:
+            result = load(data)
+            retained = deep_sizeof(result)
+
+        sample = MemorySample(
+            endpoint=str(endpoint),
+            customer_id=customer_id,
+            body=len(response.content),
+            decoded=decoded,
+            retained=retained,
+        )
+        for hook in (self.on_sample, *hooks):
+            if hook is not None:
+                hook(sample)
+        return result
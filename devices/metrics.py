@@ -0,0 +1,330 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from dataclasses import dataclass
+
+from devices.compression import wire_bytes
+from devices.utils import logger
+
+# Upper bounds in seconds of the latency histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+@dataclass
+class RequestSample:  # pylint: disable=too-many-instance-attributes
+    """
+    One HTTP request (every retry or hedge is a sample of its own).
+    ``status_code`` is None and ``error`` the exception class name when the
+    request failed without a response.
+    """
+    endpoint: str
+    method: str
+    latency: float
+    status_code: int = None
+    bytes_in: int = 0
+    bytes_out: int = 0
+    error: str = None
+
+
+@dataclass
+class RequestTimings:  # pylint: disable=too-many-instance-attributes
+    """
+    Where the time of a query went, in seconds:
+
+    - ``request``: in the transport, from sending to a successful response
+      (rate limiting, retries and backoff included)
+    - ``ttfb``: of the final attempt, until its response headers arrived
+    - ``download``: of the final attempt, reading (and decompressing) the body
+    - ``decode``: parsing the JSON body
+    - ``load``: marshmallow schema loading, ``post_load`` objects included
+    """
+    endpoint: str
+    method: str
+    request: float
+    ttfb: float = None
+    download: float = None
+    decode: float = 0.0
+    load: float = 0.0
+
+    @property
+    def total(self):
+        return self.request + self.decode + self.load
+
+    def phases(self):
+        return dict(ttfb=self.ttfb, download=self.download, decode=self.decode, load=self.load)
+
+
+@dataclass
+class MemorySample:
+    """
+    Memory taken by one response of a customer, in bytes: its ``body``, an
+    estimate of its decoded JSON (``decoded``) and the ``retained`` size of
+    the objects loaded out of it (None when not measured).
+    """
+    endpoint: str
+    customer_id: str
+    body: int
+    decoded: int
+    retained: int = None
+
+
+class Histogram:
+    """
+    Cumulative histogram: ``counts[i]`` is the number of observations up to
+    ``buckets[i]``, the last count being for observations above every bucket.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self._counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    @property
+    def counts(self):
+        counts, total = [], 0
+        for count in self._counts:
+            total += count
+            counts.append(total)
+        return counts
+
+
+class MetricsSink:
+    """
+    Receives the samples recorded by ``Metrics``. Implementations must be
+    thread safe and fast, they run on the request path.
+    """
+
+    def record(self, sample: RequestSample):
+        raise NotImplementedError
+
+    def record_timings(self, timings: RequestTimings):
+        """
+        Phase timings of a query, ignored unless overridden.
+        """
+
+    def record_memory(self, sample: MemorySample):
+        """
+        Memory taken by a response, ignored unless overridden.
+        """
+
+
+class InMemorySink(MetricsSink):
+    """
+    Aggregates samples per (endpoint, method): latency histogram, status code
+    counts, bytes in and out and error counts.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self._buckets = buckets
+        self._series = {}
+        self._phases = {}
+        self._memory = {}
+        self._lock = threading.Lock()
+
+    def record(self, sample: RequestSample):
+        key = (sample.endpoint, sample.method)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = dict(
+                    latency=Histogram(self._buckets),
+                    statuses=Counter(),
+                    errors=Counter(),
+                    bytes_in=0,
+                    bytes_out=0,
+                )
+            series["latency"].observe(sample.latency)
+            if sample.status_code is not None:
+                series["statuses"][sample.status_code] += 1
+            if sample.error is not None:
+                series["errors"][sample.error] += 1
+            series["bytes_in"] += sample.bytes_in
+            series["bytes_out"] += sample.bytes_out
+
+    def record_timings(self, timings: RequestTimings):
+        with self._lock:
+            phases = self._phases.setdefault((timings.endpoint, timings.method), {})
+            for phase, seconds in timings.phases().items():
+                if seconds is None:
+                    continue
+                histogram = phases.get(phase)
+                if histogram is None:
+                    histogram = phases[phase] = Histogram(self._buckets)
+                histogram.observe(seconds)
+
+    def record_memory(self, sample: MemorySample):
+        with self._lock:
+            memory = self._memory.get((sample.endpoint, sample.customer_id))
+            if memory is None:
+                memory = self._memory[(sample.endpoint, sample.customer_id)] = Counter()
+            memory["pages"] += 1
+            for name in ("body", "decoded", "retained"):
+                size = getattr(sample, name)
+                if size is None:
+                    continue
+                memory[f"{name}_bytes"] += size
+                memory[f"max_{name}_bytes"] = max(memory[f"max_{name}_bytes"], size)
+
+    def memory(self):
+        """
+        Snapshot of the memory taken by responses keyed by (endpoint, customer
+        id): ``pages`` and, for the body, decoded JSON and retained objects,
+        the total and largest page sizes (``body_bytes``, ``max_body_bytes``, ...).
+        """
+        with self._lock:
+            return {key: dict(memory) for key, memory in self._memory.items()}
+
+    def phases(self):
+        """
+        Snapshot of the phase timings keyed by (endpoint, method) and phase.
+        """
+        with self._lock:
+            return {
+                key: {
+                    phase: dict(
+                        count=histogram.count,
+                        sum=histogram.sum,
+                        buckets=dict(zip(histogram.buckets + (float("inf"),), histogram.counts)),
+                    ) for phase, histogram in phases.items()
+                } for key, phases in self._phases.items()
+            }
+
+    def series(self):
+        """
+        Snapshot of the aggregated series keyed by (endpoint, method).
+        """
+        with self._lock:
+            return {
+                key: dict(
+                    requests=series["latency"].count,
+                    latency_sum=series["latency"].sum,
+                    latency_buckets=dict(zip(series["latency"].buckets + (float("inf"),), series["latency"].counts)),
+                    statuses=dict(series["statuses"]),
+                    errors=dict(series["errors"]),
+                    bytes_in=series["bytes_in"],
+                    bytes_out=series["bytes_out"],
+                ) for key, series in self._series.items()
+            }
+
+
+class LoggingSink(MetricsSink):
+    """
+    Logs every sample, like the former ``timed_request`` decorator did.
+    """
+
+    def __init__(self, log=logger.info):
+        self._log = log
+
+    def record(self, sample: RequestSample):
+        outcome = sample.status_code if sample.error is None else sample.error
+        self._log(f"{sample.method} {sample.endpoint} {outcome} in {sample.latency * 1000:.2f} ms")
+
+
+class Metrics:
+    """
+    Records request samples into its sinks. Components take ``metrics=None``
+    by default and skip timing altogether, so disabled metrics cost nothing.
+    """
+
+    def __init__(self, *sinks: MetricsSink, clock=time.perf_counter):
+        self.sinks = list(sinks) or [InMemorySink()]
+        self.clock = clock
+
+    def record(self, sample: RequestSample):
+        for sink in self.sinks:
+            sink.record(sample)
+
+    def record_timings(self, timings: RequestTimings):
+        for sink in self.sinks:
+            sink.record_timings(timings)
+
+    def record_memory(self, sample: MemorySample):
+        for sink in self.sinks:
+            sink.record_memory(sample)
+
+    def series(self):
+        """
+        Series of the first in memory sink, empty when there is none.
+        """
+        for sink in self.sinks:
+            if isinstance(sink, InMemorySink):
+                return sink.series()
+        return {}
+
+    def phases(self):
+        """
+        Phase timings of the first in memory sink, empty when there is none.
+        """
+        for sink in self.sinks:
+            if isinstance(sink, InMemorySink):
+                return sink.phases()
+        return {}
+
+    def memory(self):
+        """
+        Memory accounting of the first in memory sink, empty when there is none.
+        """
+        for sink in self.sinks:
+            if isinstance(sink, InMemorySink):
+                return sink.memory()
+        return {}
+
+
+def measure(metrics: Metrics, endpoint, method, send):
+    """
+    Calls ``send`` (returning a response) and records it into ``metrics``.
+    """
+    started_at = metrics.clock()
+    try:
+        response = send()
+    except Exception as err:
+        metrics.record(RequestSample(str(endpoint), method, metrics.clock() - started_at, error=type(err).__name__))
+        raise
+
+    body = getattr(response.request, "body", None)
+    metrics.record(
+        RequestSample(
+            str(endpoint),
+            method,
+            metrics.clock() - started_at,
+            status_code=response.status_code,
+            bytes_in=wire_bytes(response),
+            bytes_out=len(body) if body else 0,
+        )
+    )
+    return response
+
+
+# pylint: disable=too-many-arguments
+def load_timed(response, load, endpoint, method, started_at, hooks):
+    """
+    Decodes the JSON body of ``response`` and loads it with ``load``, passing
+    the ``RequestTimings`` of the query (sent at ``started_at``, a
+    ``time.perf_counter()`` value) to every hook.
+    """
+    fetched_at = time.perf_counter()
+    data = response.json()
+    decoded_at = time.perf_counter()
+    result = load(data)
+    loaded_at = time.perf_counter()
+
+    phases = getattr(response, "phases", None) or {}
+    timings = RequestTimings(
+        endpoint=str(endpoint),
+        method=method,
+        request=fetched_at - started_at,
+        ttfb=phases.get("ttfb"),
+        download=phases.get("download"),
+        decode=decoded_at - fetched_at,
+        load=loaded_at - decoded_at,
+    )
+    for hook in hooks:
+        hook(timings)
+    return result
@@ -0,0 +1,141 @@
+import cProfile
+import io
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+
+from devices.utils import logger
+
+
+@dataclass
+class Profile:
+    """
+    cProfile of the JSON decoding and schema loading of one response.
+    ``reason`` is why it was profiled: ``sampled``, ``slow`` or ``large``.
+    """
+    endpoint: str
+    method: str
+    reason: str
+    duration: float
+    body_bytes: int
+    stats: pstats.Stats
+
+    def text(self, sort="cumulative", limit=30):
+        stream = io.StringIO()
+        stats = pstats.Stats(stream=stream)
+        stats.add(self.stats)
+        stats.sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+
+class SlowRequestProfiler:  # pylint: disable=too-many-instance-attributes
+    """
+    Opt-in cProfile of the decode and ``schema.load`` phase of a query, taken
+    when its request took more than ``threshold`` seconds, its body is larger
+    than ``size_threshold`` bytes or it is picked by a ``sample_rate`` draw.
+    Other queries run unprofiled, with no overhead.
+
+    Profiles lasting at least ``min_duration`` go to ``on_profile`` and are
+    written as ``.prof`` files (readable by ``pstats`` or snakeviz) into
+    ``directory``. Only one query is profiled at a time, the others run
+    unprofiled meanwhile.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        threshold=None,
+        size_threshold=None,
+        sample_rate=0.0,
+        min_duration=0.0,
+        on_profile=None,
+        directory=None,
+        rand=random.random,
+    ):
+        self.threshold = threshold
+        self.size_threshold = size_threshold
+        self.sample_rate = sample_rate
+        self.min_duration = min_duration
+        self.on_profile = on_profile
+        self.directory = directory
+        self._rand = rand
+        self._profiling = threading.Lock()
+        self._lock = threading.Lock()
+        self._counters = dict(profiled=0, reported=0, skipped_busy=0)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters)
+
+    def _count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def _reason(self, elapsed, body_bytes):
+        if self.threshold is not None and elapsed >= self.threshold:
+            return "slow"
+        if self.size_threshold is not None and body_bytes >= self.size_threshold:
+            return "large"
+        if self.sample_rate and self._rand() < self.sample_rate:
+            return "sampled"
+        return None
+
+    # pylint: disable=too-many-arguments
+    def profile(self, endpoint, method, response, elapsed, load):
+        """
+        Calls ``load`` (decoding and loading ``response``, whose request took
+        ``elapsed`` seconds) under the profiler when it qualifies.
+        """
+        body_bytes = len(response.content)
+        reason = self._reason(elapsed, body_bytes)
+        if reason is None:
+            return load()
+
+        if not self._profiling.acquire(blocking=False):
+            self._count("skipped_busy")
+            return load()
+
+        profiler = cProfile.Profile()
+        try:
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiler is already active in the process
+                self._count("skipped_busy")
+                return load()
+
+            started_at = time.perf_counter()
+            try:
+                result = load()
+            finally:
+                profiler.disable()
+            duration = time.perf_counter() - started_at
+        finally:
+            self._profiling.release()
+
+        self._count("profiled")
+        if duration >= self.min_duration:
+            self._report(Profile(str(endpoint), method, reason, duration, body_bytes, pstats.Stats(profiler)))
+        return result
+
+    def _report(self, profile):
+        self._count("reported")
+        try:
+            if self.directory is not None:
+                self._write(profile)
+            if self.on_profile is not None:
+                self.on_profile(profile)
+        except Exception:  # pylint: disable=broad-except
+            # Profiling must never fail the query
+            logger.exception(f"Failed to report the profile of {profile.method} {profile.endpoint}")
+
+    def _write(self, profile):
+        os.makedirs(self.directory, exist_ok=True)
+        name = re.sub(r"[^A-Za-z0-9]+", "_", f"{profile.method}{profile.endpoint}").strip("_")
+        path = os.path.join(self.directory, f"{time.time_ns()}-{profile.reason}-{name}.prof")
+        profile.stats.dump_stats(path)
+        return path
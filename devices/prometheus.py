@@ -0,0 +1,321 @@
+import math
+import threading
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+try:
+    from prometheus_client.core import Metric
+except ImportError:  # pragma: no cover
+    Metric = None
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@dataclass
+class MetricFamily:
+    """
+    A metric and its samples, given as (name suffix, labels, value).
+    """
+    name: str
+    type: str
+    help: str
+    samples: List[tuple] = field(default_factory=list)
+
+    def add(self, labels, value, suffix=""):
+        self.samples.append((suffix, labels, value))
+        return self
+
+
+def _escape(value):
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _format_value(value):
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _ratio(part, total):
+    return part / total if total else 0.0
+
+
+def _histogram(family, labels, buckets, count, total):
+    for bound, cumulative in buckets.items():
+        family.add(dict(labels, le=_format_value(float(bound))), cumulative, suffix="_bucket")
+    family.add(labels, count, suffix="_count")
+    family.add(labels, total, suffix="_sum")
+
+
+class PrometheusExporter:  # pylint: disable=too-many-instance-attributes
+    """
+    Exposes the metrics of the client in the Prometheus text format, from a
+    ``Metrics`` (latency and phase histograms per endpoint, deserialization
+    time included, and memory taken per customer), a ``RetryPolicy``, a
+    ``NegativeCache``, a ``SingleFlight``, connection pools (callables
+    returning ``pool_stats``) and ``Auth0Client`` token requests. Everything
+    is read when scraped, nothing is recorded twice.
+
+    ``expose`` renders the text format, ``register`` adds the exporter as a
+    collector of a ``prometheus_client`` registry and ``serve`` runs a tiny
+    HTTP server answering scrapes.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        metrics=None,
+        retry_policy=None,
+        negative_cache=None,
+        single_flight=None,
+        pools=(),
+        auth0_clients=(),
+        namespace="devices_client",
+    ):
+        self.metrics = metrics
+        self.retry_policy = retry_policy
+        self.negative_cache = negative_cache
+        self.single_flight = single_flight
+        self.pools = list(pools)
+        self.auth0_clients = list(auth0_clients)
+        self.namespace = namespace
+
+    @classmethod
+    def from_client(cls, client, **kwargs):
+        """
+        Exporter of everything ``client`` (a ``DevicesV2API`` or ``DevicesV1API``)
+        is configured with, the Auth0 client authenticating it included.
+        """
+        auth0_client = getattr(client.session.auth, "provider", None)
+        return cls(
+            metrics=client.metrics,
+            retry_policy=client.transport.retry_policy,
+            negative_cache=getattr(client, "negative_cache", None),
+            single_flight=getattr(client, "single_flight", None),
+            pools=[client.pool_stats],
+            auth0_clients=[auth0_client] if hasattr(auth0_client, "stats") else [],
+            **kwargs,
+        )
+
+    def _family(self, name, metric_type, description):
+        return MetricFamily(f"{self.namespace}_{name}", metric_type, description)
+
+    def families(self):
+        return [
+            *self._request_families(),
+            *self._phase_families(),
+            *self._memory_families(),
+            *self._retry_families(),
+            *self._cache_families(),
+            *self._pool_families(),
+            *self._token_families(),
+        ]
+
+    def _request_families(self):
+        series = self.metrics.series() if self.metrics is not None else {}
+        if not series:
+            return []
+
+        latency = self._family("request_duration_seconds", "histogram", "Latency of HTTP requests")
+        requests = self._family("requests", "counter", "HTTP requests by status code")
+        errors = self._family("request_errors", "counter", "HTTP requests failed without a response")
+        bytes_in = self._family("response_bytes", "counter", "Bytes received on the wire")
+        bytes_out = self._family("request_bytes", "counter", "Bytes of request bodies sent")
+        for (endpoint, method), values in sorted(series.items()):
+            labels = dict(endpoint=endpoint, method=method)
+            _histogram(latency, labels, values["latency_buckets"], values["requests"], values["latency_sum"])
+            for status, count in sorted(values["statuses"].items()):
+                requests.add(dict(labels, status=status), count, suffix="_total")
+            for error, count in sorted(values["errors"].items()):
+                errors.add(dict(labels, error=error), count, suffix="_total")
+            bytes_in.add(labels, values["bytes_in"], suffix="_total")
+            bytes_out.add(labels, values["bytes_out"], suffix="_total")
+        return [latency, requests, errors, bytes_in, bytes_out]
+
+    def _phase_families(self):
+        phases = self.metrics.phases() if self.metrics is not None else {}
+        if not phases:
+            return []
+
+        family = self._family(
+            "phase_duration_seconds",
+            "histogram",
+            "Time of the phases of a query: ttfb, download, JSON decode and schema load",
+        )
+        for (endpoint, method), histograms in sorted(phases.items()):
+            for phase, histogram in sorted(histograms.items()):
+                labels = dict(endpoint=endpoint, method=method, phase=phase)
+                _histogram(family, labels, histogram["buckets"], histogram["count"], histogram["sum"])
+        return [family]
+
+    def _memory_families(self):
+        memory = self.metrics.memory() if self.metrics is not None else {}
+        if not memory:
+            return []
+
+        pages = self._family("pages", "counter", "Responses loaded per customer")
+        sizes = self._family("page_memory_bytes", "counter", "Memory taken by the responses of a customer by kind")
+        largest = self._family("page_memory_max_bytes", "gauge", "Largest page of a customer by kind")
+        for (endpoint, customer_id), values in sorted(memory.items(), key=lambda item: tuple(map(str, item[0]))):
+            labels = dict(endpoint=endpoint, customer_id=customer_id or "")
+            pages.add(labels, values["pages"], suffix="_total")
+            for kind in ("body", "decoded", "retained"):
+                if f"{kind}_bytes" in values:
+                    sizes.add(dict(labels, kind=kind), values[f"{kind}_bytes"], suffix="_total")
+                    largest.add(dict(labels, kind=kind), values[f"max_{kind}_bytes"])
+        return [pages, sizes, largest]
+
+    def _retry_families(self):
+        if self.retry_policy is None:
+            return []
+
+        stats = self.retry_policy.stats()
+        requests = self._family("retry_requests", "counter", "Requests sent through the retry policy")
+        requests.add({}, stats["requests"], suffix="_total")
+        retries = self._family("retries", "counter", "Retried requests")
+        retries.add({}, stats["retries"], suffix="_total")
+        skipped = self._family("retries_skipped", "counter", "Retries not attempted by reason")
+        for reason in ("budget_exhausted", "exhausted", "deadline_exceeded"):
+            skipped.add(dict(reason=reason), stats[reason], suffix="_total")
+        budget = self._family("retry_budget_tokens", "gauge", "Retries left in the retry budget")
+        budget.add({}, stats["budget_tokens"])
+        return [requests, retries, skipped, budget]
+
+    def _cache_families(self):
+        families = []
+        if self.negative_cache is not None:
+            stats = self.negative_cache.stats()
+            lookups = self._family("negative_cache_lookups", "counter", "Negative cache lookups by result")
+            lookups.add(dict(result="hit"), stats["hits"], suffix="_total")
+            lookups.add(dict(result="miss"), stats["misses"], suffix="_total")
+            hit_ratio = self._family("negative_cache_hit_ratio", "gauge", "Share of negative cache lookups that hit")
+            hit_ratio.add({}, _ratio(stats["hits"], stats["hits"] + stats["misses"]))
+            entries = self._family("negative_cache_entries", "gauge", "Entries in the negative cache")
+            entries.add({}, stats["size"])
+            families += [lookups, hit_ratio, entries]
+        if self.single_flight is not None:
+            stats = self.single_flight.stats()
+            calls = self._family(
+                "coalesced_calls", "counter", "Calls executed or served by an identical call in flight"
+            )
+            calls.add(dict(result="executed"), stats["executed"], suffix="_total")
+            calls.add(dict(result="coalesced"), stats["coalesced"], suffix="_total")
+            coalesced = self._family("coalesced_ratio", "gauge", "Share of calls served by an identical call in flight")
+            coalesced.add({}, _ratio(stats["coalesced"], stats["executed"] + stats["coalesced"]))
+            families += [calls, coalesced]
+        return families
+
+    def _pool_families(self):
+        stats = {}
+        for pool_stats in self.pools:
+            stats.update(pool_stats())
+        if not stats:
+            return []
+
+        connections = self._family("pool_connections", "gauge", "Pooled connections by state")
+        maxsize = self._family("pool_maxsize", "gauge", "Maximum connections kept per host")
+        utilization = self._family("pool_utilization", "gauge", "Share of the pool connections in use")
+        opened = self._family("pool_connections_opened", "counter", "Connections opened since the pool was created")
+        requests = self._family("pool_requests", "counter", "Requests sent through the pool")
+        for host, pool in sorted(stats.items()):
+            labels = dict(host=host)
+            connections.add(dict(labels, state="in_use"), pool["in_use"])
+            connections.add(dict(labels, state="idle"), pool["idle"])
+            maxsize.add(labels, pool["maxsize"])
+            utilization.add(labels, _ratio(pool["in_use"], pool["maxsize"]))
+            opened.add(labels, pool["connections"], suffix="_total")
+            requests.add(labels, pool["requests"], suffix="_total")
+        return [connections, maxsize, utilization, opened, requests]
+
+    def _token_families(self):
+        if not self.auth0_clients:
+            return []
+
+        requests = self._family("token_requests", "counter", "Auth0 token requests, refreshes included")
+        failures = self._family("token_request_failures", "counter", "Failed Auth0 token requests")
+        from_store = self._family("token_store_hits", "counter", "Tokens taken from the token store")
+        for auth0_client in self.auth0_clients:
+            labels = dict(audience=auth0_client.audience)
+            stats = auth0_client.stats()
+            requests.add(labels, stats["requested"], suffix="_total")
+            failures.add(labels, stats["failed"], suffix="_total")
+            from_store.add(labels, stats["from_store"], suffix="_total")
+        return [requests, failures, from_store]
+
+    def expose(self):
+        """
+        Every metric in the Prometheus text exposition format.
+        """
+        lines = []
+        for family in self.families():
+            lines.append(f"# HELP {family.name} {_escape(family.help)}")
+            lines.append(f"# TYPE {family.name} {family.type}")
+            for suffix, labels, value in family.samples:
+                lines.append(f"{family.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def collect(self):
+        """
+        ``prometheus_client`` collector protocol.
+        """
+        if Metric is None:
+            raise ImportError("Registering the exporter needs prometheus_client")
+
+        for family in self.families():
+            metric = Metric(family.name, family.help, family.type)
+            for suffix, labels, value in family.samples:
+                metric.add_sample(family.name + suffix, {name: str(value) for name, value in labels.items()}, value)
+            yield metric
+
+    def register(self, registry=None):
+        """
+        Adds the exporter to ``registry``, the default ``prometheus_client`` one if not given.
+        """
+        if registry is None:
+            if Metric is None:
+                raise ImportError("Registering the exporter needs prometheus_client")
+            from prometheus_client import REGISTRY  # pylint: disable=import-outside-toplevel
+            registry = REGISTRY
+        registry.register(self)
+        return registry
+
+    def handler(self):
+        """
+        ``BaseHTTPRequestHandler`` answering every GET with the metrics.
+        """
+        exporter = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+
+            def do_GET(self):  # pylint: disable=invalid-name
+                body = exporter.expose().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *_):
+                pass
+
+        return MetricsHandler
+
+    def serve(self, port=0, host="127.0.0.1"):
+        """
+        Serves the metrics from a background thread, returns the server
+        (``server.server_port`` is the port when ``port`` is 0, call
+        ``server.shutdown()`` to stop it).
+        """
+        server = ThreadingHTTPServer((host, port), self.handler())
+        thread = threading.Thread(target=server.serve_forever, name="prometheus-exporter", daemon=True)
+        thread.start()
+        return server
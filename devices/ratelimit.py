@@ -0,0 +1,89 @@
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Token bucket allowing ``rate`` requests per second with bursts of up to
+    ``burst`` requests.
+
+    Callers reserve a token under a lock and then wait outside of it for the
+    reservation to become due, so waiting threads (or asyncio tasks, through
+    ``acquire_async``) are served in order and never block each other.
+    """
+
+    def __init__(self, rate, burst=1, clock=time.monotonic):
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate must be positive and burst at least 1")
+
+        self._rate = rate
+        self._burst = burst
+        self._clock = clock
+        self._tokens = burst
+        self._updated_at = clock()
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self):
+        return self._rate
+
+    @property
+    def burst(self):
+        return self._burst
+
+    def reserve(self):
+        """
+        Takes a token and returns how many seconds the caller must wait before using it.
+        """
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self._burst, self._tokens + (now - self._updated_at) * self._rate)
+            self._updated_at = now
+            self._tokens -= 1
+            return 0 if self._tokens >= 0 else -self._tokens / self._rate
+
+
+class RateLimiter:
+    """
+    Client side rate limit: a global ``TokenBucket`` plus optional buckets for
+    specific endpoints, given as ``{endpoint: (rate, burst)}``. A request must
+    get a token from both its endpoint bucket and the global one.
+    """
+
+    def __init__(self, rate, burst=1, per_endpoint=None, clock=time.monotonic, sleep=time.sleep):
+        self._bucket = TokenBucket(rate, burst, clock=clock)
+        self._endpoint_buckets = {
+            str(endpoint): TokenBucket(endpoint_rate, endpoint_burst, clock=clock)
+            for endpoint, (endpoint_rate, endpoint_burst) in (per_endpoint or {}).items()
+        }
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._counters = dict(acquired=0, throttled=0, waited_seconds=0.0)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters)
+
+    def _reserve(self, endpoint):
+        wait = self._bucket.reserve()
+        endpoint_bucket = self._endpoint_buckets.get(str(endpoint)) if endpoint is not None else None
+        if endpoint_bucket is not None:
+            wait = max(wait, endpoint_bucket.reserve())
+
+        with self._lock:
+            self._counters["acquired"] += 1
+            if wait > 0:
+                self._counters["throttled"] += 1
+                self._counters["waited_seconds"] += wait
+        return wait
+
+    def acquire(self, endpoint=None):
+        wait = self._reserve(endpoint)
+        if wait > 0:
+            self._sleep(wait)
+
+    async def acquire_async(self, endpoint=None):
+        wait = self._reserve(endpoint)
+        if wait > 0:
+            await asyncio.sleep(wait)
@@ -0,0 +1,163 @@
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from http import HTTPStatus
+
+from requests.exceptions import ConnectionError as RequestsConnectionError
+from requests.exceptions import Timeout
+
+RETRYABLE_STATUSES = frozenset(
+    {
+        HTTPStatus.TOO_MANY_REQUESTS,
+        HTTPStatus.BAD_GATEWAY,
+        HTTPStatus.SERVICE_UNAVAILABLE,
+        HTTPStatus.GATEWAY_TIMEOUT,
+    }
+)
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+
+class RetryBudget:
+    """
+    Caps retries to a fraction of the requests, so a struggling server is not
+    flooded with retries on top of the regular traffic.
+
+    Every request deposits ``ratio`` tokens (up to ``max_tokens``) and every
+    retry withdraws a whole one. The budget starts full.
+    """
+
+    def __init__(self, ratio=0.2, max_tokens=10):
+        self._ratio = ratio
+        self._max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._lock = threading.Lock()
+
+    @property
+    def tokens(self):
+        return self._tokens
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self._max_tokens, self._tokens + self._ratio)
+
+    def withdraw(self):
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class RetryPolicy:  # pylint: disable=too-many-instance-attributes
+    """
+    Retries idempotent requests failing with a transient status or a
+    connection error, waiting an exponential backoff with full jitter
+    (a random delay between 0 and ``backoff_base * 2 ** attempt``, capped at
+    ``backoff_max``) or the ``Retry-After`` given by the server.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        max_retries=3,
+        backoff_base=0.1,
+        backoff_max=10,
+        max_retry_after=60,
+        statuses=RETRYABLE_STATUSES,
+        methods=IDEMPOTENT_METHODS,
+        budget: RetryBudget = None,
+        sleep=time.sleep,
+    ):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_retry_after = max_retry_after
+        self.statuses = frozenset(statuses)
+        self.methods = frozenset(method.upper() for method in methods)
+        self.budget = budget if budget is not None else RetryBudget()
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._counters = dict(requests=0, retries=0, budget_exhausted=0, exhausted=0, deadline_exceeded=0)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, budget_tokens=self.budget.tokens)
+
+    def _count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
+    def retry_after(self, response):
+        """
+        Seconds to wait according to the ``Retry-After`` header of ``response``,
+        given either in seconds or as an HTTP date. None when missing or invalid.
+        """
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+
+        try:
+            seconds = float(value)
+        except ValueError:
+            try:
+                date = parsedate_to_datetime(value)
+            except (TypeError, ValueError):
+                return None
+            if date.tzinfo is None:
+                # "-0000" dates are parsed as naive ones, they are in UTC too
+                date = date.replace(tzinfo=timezone.utc)
+            seconds = (date - datetime.now(timezone.utc)).total_seconds()
+
+        return min(max(seconds, 0), self.max_retry_after)
+
+    def _can_retry(self, method, attempt, delay, deadline):
+        if method.upper() not in self.methods:
+            return False
+
+        if attempt >= self.max_retries:
+            self._count("exhausted")
+            return False
+
+        if deadline is not None and delay >= deadline.remaining():
+            self._count("deadline_exceeded")
+            return False
+
+        if not self.budget.withdraw():
+            self._count("budget_exhausted")
+            return False
+
+        return True
+
+    def call(self, method, send, deadline=None):
+        """
+        Calls ``send`` (returning a ``requests.Response``) until it succeeds,
+        fails with a non retryable error or retries are exhausted. No retry
+        is attempted when its delay would go past ``deadline``.
+        """
+        self._count("requests")
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            try:
+                response = send()
+            except (RequestsConnectionError, Timeout):
+                delay = self.backoff(attempt)
+                if not self._can_retry(method, attempt, delay, deadline):
+                    raise
+            else:
+                if response.status_code not in self.statuses:
+                    return response
+                retry_after = self.retry_after(response)
+                delay = retry_after if retry_after is not None else self.backoff(attempt)
+                if not self._can_retry(method, attempt, delay, deadline):
+                    return response
+                response.close()
+
+            attempt += 1
+            self._count("retries")
+            self._sleep(delay)
@@ -0,0 +1,227 @@
+import threading
+
+from requests import Request, Session
+from requests.adapters import DEFAULT_POOLBLOCK, DEFAULT_POOLSIZE, BaseAdapter, HTTPAdapter
+from urllib3.util import parse_url
+
+from devices.auth import Auth0Bearer
+from devices.http2 import HTTP2Adapter
+from devices.utils import logger
+
+# (connect, read) timeouts in seconds for every request
+DEFAULT_TIMEOUT = (5, 60)
+
+
+def _new_adapter(pool_connections, pool_maxsize, pool_block, http2):
+    if http2:
+        return HTTP2Adapter(max_connections=pool_maxsize)
+    return HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        pool_block=pool_block,
+    )
+
+
+class BorrowedAdapter(BaseAdapter):
+    """
+    Sends through a ``SharedAdapters`` adapter without closing it when the
+    session that borrowed it is closed.
+    """
+
+    def __init__(self, adapter):
+        super().__init__()
+        self.adapter = adapter
+
+    # pylint: disable=too-many-arguments
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        return self.adapter.send(request, stream=stream, timeout=timeout, verify=verify, cert=cert, proxies=proxies)
+
+    def close(self):
+        pass
+
+
+class SharedAdapters:
+    """
+    Process wide transport adapters (and so connection pools) keyed by the
+    origin of a base URL and the pool options, so short lived clients reuse
+    warm connections. Only the transport is shared, auth stays per session.
+    """
+
+    def __init__(self):
+        self._adapters = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _origin(url):
+        url = parse_url(url)
+        return f"{url.scheme}://{url.host}:{url.port or (443 if url.scheme == 'https' else 80)}"
+
+    def get(self, url, **pool_options):
+        key = (self._origin(url), tuple(sorted(pool_options.items())))
+        with self._lock:
+            adapter = self._adapters.get(key)
+            if adapter is None:
+                adapter = self._adapters[key] = _new_adapter(**pool_options)
+            return adapter
+
+    def __len__(self):
+        return len(self._adapters)
+
+    def close(self):
+        with self._lock:
+            adapters, self._adapters = self._adapters, {}
+        for adapter in adapters.values():
+            adapter.close()
+
+
+SHARED_ADAPTERS = SharedAdapters()
+
+
+# pylint: disable=too-many-arguments
+def new_session(
+    auth_token,
+    pool_connections=DEFAULT_POOLSIZE,
+    pool_maxsize=DEFAULT_POOLSIZE,
+    pool_block=DEFAULT_POOLBLOCK,
+    keep_alive=True,
+    http2=False,
+    shared_url=None,
+):
+    """
+    Builds an authenticated session.
+
+    ``pool_connections`` is the number of hosts to keep a connection pool for,
+    ``pool_maxsize`` the maximum number of connections kept per host and
+    ``pool_block`` whether requests wait for a free connection when all of
+    them are in use (instead of opening one that is discarded afterwards).
+
+    With ``http2`` requests are multiplexed over HTTP/2 connections (at most
+    ``pool_maxsize`` per host) by an ``HTTP2Adapter``.
+
+    With ``shared_url`` the session borrows the process wide adapter of that
+    URL (see ``SharedAdapters``) instead of creating its own.
+    """
+    session = Session()
+    session.auth = Auth0Bearer(auth_token)
+
+    pool_options = dict(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        pool_block=pool_block,
+        http2=http2,
+    )
+    if shared_url:
+        adapter = BorrowedAdapter(SHARED_ADAPTERS.get(shared_url, **pool_options))
+    else:
+        adapter = _new_adapter(**pool_options)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    if not keep_alive:
+        session.headers["Connection"] = "close"
+
+    return session
+
+
+def pool_stats(session):
+    """
+    Utilization of the connection pools of ``session`` keyed by host:
+
+    - ``maxsize``: maximum number of connections kept for the host
+    - ``in_use``: connections currently checked out by requests
+    - ``idle``: open connections waiting to be reused
+    - ``connections``: connections opened since the pool was created
+    - ``requests``: requests sent through the pool
+    """
+    stats = {}
+    adapters = {
+        id(adapter): adapter
+        for adapter in (getattr(adapter, "adapter", adapter) for adapter in session.adapters.values())
+    }
+    for adapter in adapters.values():
+        if isinstance(adapter, HTTP2Adapter):
+            stats.update(adapter.pool_stats())
+            continue
+
+        pools = getattr(getattr(adapter, "poolmanager", None), "pools", None)
+        if pools is None:
+            continue
+
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+
+            queue = list(pool.pool.queue) if pool.pool is not None else []
+            stats[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                "maxsize": pool.pool.maxsize if pool.pool is not None else 0,
+                "in_use": (pool.pool.maxsize - len(queue)) if pool.pool is not None else 0,
+                "idle": sum(1 for conn in queue if conn is not None),
+                "connections": pool.num_connections,
+                "requests": pool.num_requests,
+            }
+    return stats
+
+
+def connection_pool(session, url):
+    """
+    The urllib3 pool requests itself uses for ``url`` (with the same TLS
+    settings), None when the session adapter is not based on urllib3.
+    """
+    adapter = session.get_adapter(url)
+    adapter = getattr(adapter, "adapter", adapter)
+    if not hasattr(adapter, "poolmanager"):
+        return None
+
+    request = Request("GET", url).prepare()
+    settings = session.merge_environment_settings(url, {}, None, None, None)
+    if hasattr(adapter, "get_connection_with_tls_context"):
+        return adapter.get_connection_with_tls_context(
+            request, settings["verify"], proxies=settings["proxies"], cert=settings["cert"]
+        )
+    return adapter.get_connection(url, settings["proxies"])
+
+
+def _open_connections(session, url, connections):
+    pool = connection_pool(session, url)
+    if pool is None:
+        # Only urllib3 pools can be filled ahead of time
+        return 0
+
+    # pylint: disable=protected-access
+    opened = []
+    try:
+        for _ in range(min(connections, pool.pool.maxsize)):
+            conn = pool._get_conn()
+            opened.append(conn)
+            if getattr(conn, "sock", None) is None:
+                conn.connect()
+    finally:
+        for conn in opened:
+            pool._put_conn(conn)
+    return len(opened)
+
+
+def warm_up(session, url, connections=1, background=False):
+    """
+    Opens up to ``connections`` pooled connections to the host of ``url``
+    (DNS resolution, TCP and TLS handshakes) ahead of the first request.
+
+    In the ``background`` it returns the started thread, otherwise the number
+    of connections opened. Failures are logged, requests open connections
+    lazily as usual then.
+    """
+
+    def run():
+        try:
+            return _open_connections(session, url, connections)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception(f"Failed to warm up connections to {url}")
+            return 0
+
+    if not background:
+        return run()
+
+    thread = threading.Thread(target=run, name="warm-up", daemon=True)
+    thread.start()
+    return thread
@@ -17,3 +17,12 @@ AUTH0_GRANT_TYPE = 'client_credentials'
 AUTH0_AUDIENCE = AUTH0_AUDIENCE
 AUTH0_CLIENT_ID = AUTH0_CLIENT_ID
 AUTH0_CLIENT_SECRET = AUTH0_CLIENT_SECRET
+
+# Renew the Auth0 token in the background once this fraction of its lifetime
+# has passed (0 disables it). The jitter spreads renewals across processes.
+AUTH0_REFRESH_AHEAD_RATIO = float(os.getenv("AUTH0_REFRESH_AHEAD_RATIO", "0"))
+AUTH0_REFRESH_AHEAD_JITTER = float(os.getenv("AUTH0_REFRESH_AHEAD_JITTER", "0.1"))
+
+# Tokens are shared between the processes of a host through this file
+AUTH0_TOKEN_STORE_ENABLED = bool(strtobool(os.getenv("AUTH0_TOKEN_STORE_ENABLED", "true")))
+AUTH0_TOKEN_STORE_PATH = os.getenv("AUTH0_TOKEN_STORE_PATH")
@@ -0,0 +1,162 @@
+import getpass
+import json
+import os
+import stat
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+from devices.utils import logger
+
+
+@dataclass
+class StoredToken:
+    access_token: str
+    issued_at: float
+    expires_in: float
+
+    @property
+    def expires_at(self):
+        return self.issued_at + self.expires_in
+
+    def is_valid(self, now=None):
+        return self.expires_at > (time.time() if now is None else now)
+
+
+class TokenStore:
+    """
+    Storage shared by every ``Auth0Client`` that should reuse the same tokens.
+
+    ``lock`` must be held while checking the store and fetching a new token,
+    so only one of the processes sharing the store goes to Auth0.
+    """
+
+    def load(self, key):
+        raise NotImplementedError
+
+    def save(self, key, token: StoredToken):
+        raise NotImplementedError
+
+    @contextmanager
+    def lock(self, key):  # pylint: disable=unused-argument
+        yield
+
+
+def default_path():
+    """
+    Token file in a directory of the temp directory private to the current
+    user, so users of the same host never share (or plant) tokens.
+    """
+    user = os.getuid() if hasattr(os, "getuid") else getpass.getuser()
+    return os.path.join(tempfile.gettempdir(), f"api-devices-client-{user}", "tokens.json")
+
+
+def _is_private(st):
+    """
+    Whether a file is owned by the current user and not accessible to others.
+    """
+    if not hasattr(os, "getuid"):  # pragma: no cover - no ownership on Windows
+        return True
+    return st.st_uid == os.getuid() and not st.st_mode & (stat.S_IRWXG | stat.S_IRWXO)
+
+
+class FileTokenStore(TokenStore):
+    """
+    Keeps tokens in a JSON file readable by the current user only, guarded by
+    an exclusive ``flock`` on a sibling ``.lock`` file.
+
+    Files owned by another user or accessible to others are ignored, and when
+    the store cannot be used at all clients request tokens from Auth0 as if
+    it was empty.
+    """
+
+    def __init__(self, path=None):
+        self._path = path or default_path()
+        self._lock_path = f"{self._path}.lock"
+        self._thread_lock = threading.Lock()
+
+    @property
+    def path(self):
+        return self._path
+
+    def _directory(self):
+        """
+        Creates the directory of the store, checking it is private when it is the default one.
+        """
+        directory = os.path.dirname(os.path.abspath(self._path))
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        if directory == os.path.dirname(default_path()) and not _is_private(os.lstat(directory)):
+            raise PermissionError(f"Token store directory {directory} is not private to the current user")
+        return directory
+
+    def load(self, key):
+        try:
+            with open(self._path) as f:
+                if not _is_private(os.fstat(f.fileno())):
+                    logger.warning(f"Ignoring token store {self._path}, it is not private to the current user")
+                    return None
+                tokens = json.load(f)
+            return StoredToken(**tokens[key])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def save(self, key, token: StoredToken):
+        try:
+            with open(self._path) as f:
+                tokens = json.load(f)
+        except (OSError, ValueError):
+            tokens = {}
+
+        # Drop expired entries so the file does not grow forever
+        now = time.time()
+        tokens = {k: v for k, v in tokens.items() if _is_valid_entry(v, now)}
+        tokens[key] = asdict(token)
+
+        directory = self._directory()
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".api-devices-tokens-")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(tokens, f)
+            os.chmod(tmp_path, 0o600)
+            os.replace(tmp_path, self._path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _open_lock(self):
+        try:
+            self._directory()
+            return os.open(self._lock_path, os.O_RDWR | os.O_CREAT | getattr(os, "O_NOFOLLOW", 0), 0o600)
+        except OSError:
+            # Without the lock processes may request tokens concurrently, which is still correct
+            logger.exception(f"Failed to lock the token store {self._path}")
+            return None
+
+    @contextmanager
+    def lock(self, key):
+        with self._thread_lock:
+            fd = self._open_lock() if fcntl is not None else None
+            if fd is None:
+                yield
+                return
+
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                yield
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+
+
+def _is_valid_entry(entry, now):
+    try:
+        return StoredToken(**entry).is_valid(now)
+    except TypeError:
+        return False
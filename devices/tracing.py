@@ -0,0 +1,167 @@
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    from opentelemetry import propagate, trace
+except ImportError:  # pragma: no cover
+    propagate = trace = None
+
+
+class Span:
+    """
+    No-op span, the subset of the OpenTelemetry span interface used by the
+    client.
+    """
+
+    def set_attribute(self, key, value):
+        pass
+
+    def record_exception(self, exception):
+        pass
+
+    def end(self):
+        pass
+
+
+NOOP_SPAN = Span()
+
+
+class Tracer:
+    """
+    No-op tracer, the default of clients and ``Auth0Client``.
+
+    ``span`` starts a span that is the current one within its block and ends
+    with it, recording the exception raised in it if any. ``start_span``
+    starts one that must be ended explicitly, to span blocks that cannot be
+    nested (like the iteration of a generator). Spans are children of the
+    given ``parent``, otherwise of the current span.
+
+    ``inject`` returns the headers of an outgoing request with the trace
+    context of the current span added.
+    """
+
+    def start_span(self, name, attributes=None, parent=None):  # pylint: disable=unused-argument
+        return NOOP_SPAN
+
+    @contextmanager
+    def span(self, name, attributes=None, parent=None):  # pylint: disable=unused-argument
+        yield NOOP_SPAN
+
+    def inject(self, headers):
+        return headers
+
+
+NOOP_TRACER = Tracer()
+
+
+class RecordedSpan(Span):  # pylint: disable=too-many-instance-attributes
+    """
+    Span of a ``RecordingTracer``, identified as in W3C trace context.
+    """
+
+    def __init__(self, tracer, name, attributes=None, parent=None, clock=time.perf_counter):
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent is not None else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.exception = None
+        self.start = clock()
+        self.duration = None
+        self._tracer = tracer
+        self._clock = clock
+
+    @property
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def record_exception(self, exception):
+        self.exception = exception
+
+    def end(self):
+        if self.duration is None:
+            self.duration = self._clock() - self.start
+            self._tracer.finished(self)
+
+
+class RecordingTracer(Tracer):
+    """
+    Keeps the finished spans in memory and propagates a W3C ``traceparent``
+    header, for tests and debugging without an OpenTelemetry SDK.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self._clock = clock
+        self._current = contextvars.ContextVar("current_span", default=None)
+        self._lock = threading.Lock()
+        self._spans = []
+
+    @property
+    def spans(self):
+        with self._lock:
+            return list(self._spans)
+
+    @property
+    def current_span(self):
+        return self._current.get()
+
+    def finished(self, span):
+        with self._lock:
+            self._spans.append(span)
+
+    def start_span(self, name, attributes=None, parent=None):
+        return RecordedSpan(self, name, attributes, parent or self._current.get(), clock=self._clock)
+
+    @contextmanager
+    def span(self, name, attributes=None, parent=None):
+        span = self.start_span(name, attributes, parent)
+        token = self._current.set(span)
+        try:
+            yield span
+        except Exception as err:
+            span.record_exception(err)
+            raise
+        finally:
+            self._current.reset(token)
+            span.end()
+
+    def inject(self, headers):
+        span = self._current.get()
+        if span is None:
+            return headers
+        return dict(headers or {}, traceparent=span.traceparent)
+
+
+class OpenTelemetryTracer(Tracer):
+    """
+    Traces through OpenTelemetry: spans go to the configured tracer provider
+    and the trace context is injected by the global propagator.
+    """
+
+    def __init__(self, tracer=None):
+        if trace is None:
+            raise ImportError("OpenTelemetry tracing needs opentelemetry-api, install api-devices-client[tracing]")
+        self._tracer = tracer or trace.get_tracer("devices")
+
+    @staticmethod
+    def _context(parent):
+        return trace.set_span_in_context(parent) if parent is not None else None
+
+    def start_span(self, name, attributes=None, parent=None):
+        return self._tracer.start_span(name, context=self._context(parent), attributes=attributes)
+
+    @contextmanager
+    def span(self, name, attributes=None, parent=None):
+        with self._tracer.start_as_current_span(name, context=self._context(parent), attributes=attributes) as span:
+            yield span
+
+    def inject(self, headers):
+        headers = dict(headers or {})
+        propagate.inject(headers)
+        return headers
@@ -0,0 +1,416 @@
+import asyncio
+import json as jsonlib
+import time
+from functools import partial
+from http import HTTPStatus
+from urllib.parse import urlencode
+
+from requests import HTTPError
+from requests.exceptions import ConnectionError as RequestsConnectionError
+from requests.exceptions import ConnectTimeout, ReadTimeout, Timeout
+from urllib3.exceptions import ClosedPoolError, ConnectTimeoutError
+from urllib3.exceptions import HTTPError as Urllib3HTTPError
+from urllib3.exceptions import NewConnectionError, ReadTimeoutError
+from urllib3.util import Timeout as Urllib3Timeout
+from urllib3.util import parse_url
+
+from devices.errors import DeadlineExceededError, RequestTimeoutError
+from devices.metrics import load_timed, measure
+from devices.session import DEFAULT_TIMEOUT, connection_pool
+from devices.tracing import NOOP_TRACER
+
+
+class RequestsBackend:
+    """
+    Sends requests through a ``requests.Session``.
+    """
+
+    def __init__(self, session):
+        self._session = session
+
+    @property
+    def session(self):
+        return self._session
+
+    @property
+    def auth(self):
+        return self._session.auth
+
+    # pylint: disable=too-many-arguments
+    def request(self, method, url, params=None, json=None, headers=None, timeout=None):
+        """
+        Returns the response with its ``phases``: seconds until the headers
+        arrived (``ttfb``) and reading the body (``download``).
+        """
+        started_at = time.perf_counter()
+        response = self._session.request(
+            method=method,
+            url=url,
+            params=params,
+            json=json,
+            headers=headers,
+            timeout=timeout,
+        )
+        total = time.perf_counter() - started_at
+        ttfb = min(response.elapsed.total_seconds(), total)
+        response.phases = dict(ttfb=ttfb, download=total - ttfb)
+        return response
+
+
+class Urllib3Response:
+    """
+    Minimal ``requests.Response`` counterpart returned by ``Urllib3Backend``.
+    ``json()`` hands the raw body bytes straight to the JSON decoder.
+    """
+
+    def __init__(self, request, raw, phases=None):
+        self.request = request
+        self.raw = raw
+        self.url = request.url
+        self.status_code = raw.status
+        self.reason = raw.reason
+        self.headers = raw.headers
+        self.content = raw.data
+        self.phases = phases
+
+    @property
+    def ok(self):
+        return self.status_code < HTTPStatus.BAD_REQUEST
+
+    def json(self):
+        return jsonlib.loads(self.content)
+
+    def raise_for_status(self):
+        if not self.ok:
+            kind = "Client" if self.status_code < HTTPStatus.INTERNAL_SERVER_ERROR else "Server"
+            raise HTTPError(f"{self.status_code} {kind} Error: {self.reason} for url: {self.url}", response=self)
+
+    def close(self):
+        self.raw.release_conn()
+
+
+class Urllib3Request:  # pylint: disable=too-few-public-methods
+
+    def __init__(self, method, url, headers, body=None):
+        self.method = method
+        self.url = url
+        self.headers = headers
+        self.body = body
+
+
+class Urllib3Backend(RequestsBackend):
+    """
+    Sends requests straight to the urllib3 pools of the session adapters,
+    skipping ``requests`` on the hot path: no hooks, environment settings,
+    cookies, redirects nor ``PreparedRequest``/``Response`` objects. Query
+    strings are encoded once with ``urlencode``, the bearer token is read from
+    the session auth and bodies are decoded by urllib3 as they are read.
+
+    The session still provides the pools (so pooling options, shared
+    transports and warm up apply), default headers and auth. Only urllib3
+    based adapters are supported.
+    """
+
+    def __init__(self, session):
+        super().__init__(session)
+        self._pools = {}
+
+    def _pool(self, url):
+        parsed = parse_url(url)
+        origin = (parsed.scheme, parsed.host, parsed.port)
+        pool = self._pools.get(origin)
+        if pool is None:
+            pool = connection_pool(self._session, url)
+            if pool is None:
+                raise ValueError("The urllib3 backend only sends through urllib3 based adapters")
+            self._pools[origin] = pool
+        return pool, parsed.request_uri
+
+    def _headers(self, headers):
+        merged = dict(self._session.headers)
+        if headers:
+            merged.update(headers)
+        auth = self._session.auth
+        if auth is not None:
+            merged["Authorization"] = f"Bearer {auth.token}"
+        return merged
+
+    @staticmethod
+    def _timeout(timeout):
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            return Urllib3Timeout(connect=connect, read=read)
+        return Urllib3Timeout(connect=timeout, read=timeout)
+
+    # pylint: disable=too-many-arguments
+    def request(self, method, url, params=None, json=None, headers=None, timeout=None):
+        pool, path = self._pool(url)
+        if params:
+            query = urlencode(params, doseq=True)
+            path = f"{path}&{query}" if "?" in path else f"{path}?{query}"
+            url = f"{url}&{query}" if "?" in url else f"{url}?{query}"
+
+        headers = self._headers(headers)
+        body = None
+        if json is not None:
+            body = jsonlib.dumps(json).encode()
+            headers["Content-Type"] = "application/json"
+
+        started_at = time.perf_counter()
+        try:
+            raw = pool.urlopen(
+                method,
+                path,
+                body=body,
+                headers=headers,
+                retries=False,
+                redirect=False,
+                assert_same_host=False,
+                timeout=self._timeout(timeout),
+                preload_content=False,
+                decode_content=True,
+            )
+            headers_at = time.perf_counter()
+            _ = raw.data
+            raw.release_conn()
+        except ClosedPoolError:
+            # The session was closed (and its pools with it), look the pool up again
+            self._pools.clear()
+            return self.request(method, url, headers=headers, json=json, timeout=timeout)
+        except NewConnectionError as err:
+            raise RequestsConnectionError(err)
+        except ConnectTimeoutError as err:
+            raise ConnectTimeout(err)
+        except ReadTimeoutError as err:
+            raise ReadTimeout(err)
+        except Urllib3HTTPError as err:
+            raise RequestsConnectionError(err)
+
+        phases = dict(ttfb=headers_at - started_at, download=time.perf_counter() - headers_at)
+        return Urllib3Response(Urllib3Request(method, url, headers, body), raw, phases)
+
+
+BACKENDS = {
+    "requests": RequestsBackend,
+    "urllib3": Urllib3Backend,
+}
+
+
+class Transport:  # pylint: disable=too-many-instance-attributes
+    """
+    Sends the requests of v1 and v2 queries through a backend, applying the
+    request level policies: timeouts and deadlines, rate limiting, circuit
+    breaking, hedging, retries, token refresh, compression accounting and
+    metrics. Queries decode and load responses through ``load``, reporting
+    their phase timings to ``timings_hooks``, profiling them with
+    ``profiler`` and accounting their memory with ``memory_accounting``.
+    Every request gets a client span of ``tracer`` and carries its context.
+    HTTP errors are wrapped in the error class of the API.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        backend,
+        timeout=DEFAULT_TIMEOUT,
+        retry_policy=None,
+        rate_limiter=None,
+        circuit_breaker=None,
+        hedging_policy=None,
+        compression_stats=None,
+        metrics=None,
+        on_timings=None,
+        tracer=None,
+        profiler=None,
+        memory_accounting=None,
+    ):
+        self._backend = backend
+        self._timeout = timeout
+        self._retry_policy = retry_policy
+        self._rate_limiter = rate_limiter
+        self._circuit_breaker = circuit_breaker
+        self._hedging_policy = hedging_policy
+        self._compression_stats = compression_stats
+        self._metrics = metrics
+        self._tracer = tracer or NOOP_TRACER
+        self._profiler = profiler
+        self._memory_accounting = memory_accounting
+        self._memory_hooks = [metrics.record_memory] if metrics is not None else []
+        self._timings_hooks = [hook for hook in (on_timings, metrics and metrics.record_timings) if hook]
+
+    @property
+    def backend(self):
+        return self._backend
+
+    @property
+    def timeout(self):
+        return self._timeout
+
+    @property
+    def retry_policy(self):
+        return self._retry_policy
+
+    @property
+    def rate_limiter(self):
+        return self._rate_limiter
+
+    @property
+    def circuit_breaker(self):
+        return self._circuit_breaker
+
+    @property
+    def hedging_policy(self):
+        return self._hedging_policy
+
+    @property
+    def compression_stats(self):
+        return self._compression_stats
+
+    @property
+    def metrics(self):
+        return self._metrics
+
+    @property
+    def tracer(self):
+        return self._tracer
+
+    @property
+    def profiler(self):
+        return self._profiler
+
+    @property
+    def memory_accounting(self):
+        return self._memory_accounting
+
+    @property
+    def timings_hooks(self):
+        """
+        Callables receiving the ``RequestTimings`` of every query that loads a
+        response: ``on_timings`` and the metrics, if any.
+        """
+        return self._timings_hooks
+
+    # pylint: disable=too-many-arguments
+    def request(self, method, url, params=None, json=None, headers=None, endpoint=None, deadline=None, error=None):
+        """
+        Sends a request and returns its successful response.
+
+        ``endpoint`` identifies the endpoint for per endpoint policies,
+        ``deadline`` bounds the time spent on retries and ``error`` is the
+        class wrapping HTTP errors (through its ``wrap`` class method).
+        """
+        attributes = {"http.method": method, "http.url": url, "devices.endpoint": str(endpoint or url)}
+        with self._tracer.span(f"HTTP {method}", attributes) as span:
+            response = self._request(method, url, params, json, self._tracer.inject(headers), endpoint, deadline, error)
+            span.set_attribute("http.status_code", response.status_code)
+            return response
+
+    # pylint: disable=too-many-arguments
+    def _request(self, method, url, params, json, headers, endpoint, deadline, error):
+        send = partial(self._send, method, url, params, json, headers, endpoint, deadline)
+        try:
+            response = self._attempts(method, send, endpoint, deadline)
+            if response.status_code == HTTPStatus.UNAUTHORIZED and self._refresh_token(response):
+                # The token was revoked or expired, replay the request once with a new one
+                response = self._attempts(method, send, endpoint, deadline)
+            if self._compression_stats is not None:
+                self._compression_stats.record(endpoint, response)
+            response.raise_for_status()
+            return response
+        except HTTPError as err:
+            if error is None:
+                raise
+            raise error.wrap(err)
+        except Timeout as err:
+            if deadline is not None:
+                deadline.check()
+            raise RequestTimeoutError(f"Request to {url} timed out: {err}") from err
+
+    # pylint: disable=too-many-arguments
+    def load(self, response, load, endpoint, method, started_at, customer_id=None):
+        """
+        Decodes the JSON body of ``response`` (of a query sent at
+        ``started_at``, a ``time.perf_counter()`` value, for ``customer_id``)
+        and loads it with ``load``.
+        """
+        if self._memory_accounting is not None:
+            load = partial(
+                self._memory_accounting.load,
+                response,
+                load,
+                endpoint=endpoint,
+                customer_id=customer_id,
+                hooks=self._memory_hooks,
+            )
+
+        def run():
+            if self._timings_hooks:
+                return load_timed(response, load, endpoint, method, started_at, self._timings_hooks)
+            return load(response.json())
+
+        if self._profiler is None:
+            return run()
+        return self._profiler.profile(endpoint, method, response, time.perf_counter() - started_at, run)
+
+    async def request_async(self, *args, **kwargs):
+        """
+        Asyncio counterpart of ``request``, run in the default executor.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, partial(self.request, *args, **kwargs))
+
+    # pylint: disable=too-many-arguments
+    def _send(self, method, url, params, json, headers, endpoint, deadline):
+        if self._rate_limiter is not None:
+            self._rate_limiter.acquire(endpoint)
+        timeout = self._timeout if deadline is None else deadline.timeout(self._timeout)
+        send = partial(self._backend.request, method, url, params=params, json=json, headers=headers, timeout=timeout)
+        if self._metrics is None:
+            return send()
+        return measure(self._metrics, endpoint or url, method, send)
+
+    def _attempts(self, method, send, endpoint, deadline):
+        if self._circuit_breaker is not None:
+            send = self._guarded(send, endpoint, deadline)
+        if self._hedging_policy is not None and method == "GET":
+            send = partial(self._hedging_policy.call, endpoint, send)
+        if self._retry_policy is None:
+            return send()
+        return self._retry_policy.call(method, send, deadline=deadline)
+
+    def _guarded(self, send, endpoint, deadline):
+        """
+        Wraps ``send`` so every attempt goes through the circuit breaker of ``endpoint``.
+        """
+        breaker = self._circuit_breaker
+
+        def guarded_send():
+            if deadline is not None:
+                # Do not take a half open probe for an attempt that cannot be sent
+                deadline.check()
+            breaker.allow(endpoint)
+            started_at = breaker.clock()
+            try:
+                response = send()
+            except DeadlineExceededError:
+                breaker.release(endpoint)
+                raise
+            except Exception:
+                breaker.record(endpoint, success=False)
+                raise
+            breaker.record(
+                endpoint,
+                success=response.status_code < HTTPStatus.INTERNAL_SERVER_ERROR,
+                latency=breaker.clock() - started_at,
+            )
+            return response
+
+        return guarded_send
+
+    def _refresh_token(self, response):
+        refresh = getattr(self._backend.auth, "refresh", None)
+        if refresh is None:
+            return False
+
+        authorization = response.request.headers.get("Authorization", "")
+        return refresh(stale_token=authorization[len("Bearer "):] or None)
@@ -1,20 +1,92 @@
-from devices.auth import Auth0Bearer
+from devices.circuit import CircuitBreaker
+from devices.compression import CompressionStats
 from devices.errors import InvalidParamsError
+from devices.hedging import HedgingPolicy
+from devices.memory import MemoryAccounting
+from devices.metrics import Metrics
+from devices.profiling import SlowRequestProfiler
+from devices.ratelimit import RateLimiter
+from devices.retry import RetryPolicy
+from devices.session import DEFAULT_TIMEOUT, new_session, pool_stats
+from devices.tracing import Tracer
+from devices.transport import BACKENDS, Transport
 from devices.v1.query import CustomerDevices
-from requests import Session
+from requests.adapters import DEFAULT_POOLBLOCK, DEFAULT_POOLSIZE
 
 
 class DevicesV1API:
 
-    def __init__(self, url, auth_token):
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        url,
+        auth_token,
+        compression_stats: CompressionStats = None,
+        retry_policy: RetryPolicy = None,
+        rate_limiter: RateLimiter = None,
+        circuit_breaker: CircuitBreaker = None,
+        hedging_policy: HedgingPolicy = None,
+        metrics: Metrics = None,
+        on_timings=None,
+        tracer: Tracer = None,
+        profiler: SlowRequestProfiler = None,
+        memory_accounting: MemoryAccounting = None,
+        timeout=DEFAULT_TIMEOUT,
+        pool_connections=DEFAULT_POOLSIZE,
+        pool_maxsize=DEFAULT_POOLSIZE,
+        pool_block=DEFAULT_POOLBLOCK,
+        keep_alive=True,
+        http2=False,
+        shared_transport=False,
+        backend="requests",
+    ):
         self._url = url
-        self._session = self._new_session(auth_token)
+        self._session = self._new_session(
+            auth_token,
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+            keep_alive=keep_alive,
+            http2=http2,
+            shared_url=url if shared_transport else None,
+        )
+        self._transport = Transport(
+            BACKENDS[backend](self._session),
+            timeout=timeout,
+            retry_policy=retry_policy,
+            rate_limiter=rate_limiter,
+            circuit_breaker=circuit_breaker,
+            hedging_policy=hedging_policy,
+            compression_stats=compression_stats,
+            metrics=metrics,
+            on_timings=on_timings,
+            tracer=tracer,
+            profiler=profiler,
+            memory_accounting=memory_accounting,
+        )
+
+    @property
+    def transport(self):
+        return self._transport
+
+    @property
+    def metrics(self):
+        return self._transport.metrics
+
+    @property
+    def tracer(self):
+        return self._transport.tracer
+
+    @property
+    def compression_stats(self):
+        return self._transport.compression_stats
 
     @staticmethod
-    def _new_session(auth_token):
-        session = Session()
-        session.auth = Auth0Bearer(auth_token)
-        return session
+    def _new_session(auth_token, **pool_options):
+        return new_session(auth_token, **pool_options)
+
+    def pool_stats(self):
+        return pool_stats(self._session)
 
     def __enter__(self):
         return self
@@ -30,4 +102,5 @@ class DevicesV1API:
             session=self._session,
             url=self._url,
             customer_id=customer_id,
+            transport=self._transport,
         )
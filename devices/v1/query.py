@@ -1,8 +1,11 @@
+import time
 from enum import Enum
 
+from devices.compression import ACCEPT_ENCODING
+from devices.deadline import Deadline
+from devices.transport import RequestsBackend, Transport
 from devices.v1.errors import APIDevicesV1Error
 from devices.v1.schemas import CustomerDeviceStatus
-from requests import HTTPError
 
 
 class DevicesV1Endpoints(Enum):
@@ -23,19 +26,41 @@ class Query:  # pylint: disable=too-few-public-methods
     endpoint = None
     schema = None
 
-    def __init__(self, session, url, **_):
+    def __init__(self, session, url, deadline=None, transport=None, **transport_options):
         self._session = session
         self._url = url
+        self._deadline = deadline
+        self._transport = transport or Transport(RequestsBackend(session), **transport_options)
         self._query_parameters = {}
+        self._headers = {}
+        self._customer_id = None
+
+    @property
+    def transport(self):
+        return self._transport
+
+    def deadline(self, seconds):
+        if seconds:
+            self._deadline = seconds if isinstance(seconds, Deadline) else Deadline(seconds)
+        return self
 
     def execute_query(self, resource):
-        url = f"{self._url}{resource}"
-        try:
-            response = self._session.get(url=url, params=self._query_parameters)
-            response.raise_for_status()
-            return self.schema.load(response.json())
-        except HTTPError as err:
-            raise APIDevicesV1Error.wrap(err)
+        tracer = self._transport.tracer
+        with tracer.span(f"GET {self.endpoint}", {"devices.resource": resource}):
+            started_at = time.perf_counter()
+            response = self._transport.request(
+                "GET",
+                f"{self._url}{resource}",
+                params=self._query_parameters,
+                headers=self._headers,
+                endpoint=self.endpoint,
+                deadline=self._deadline,
+                error=APIDevicesV1Error,
+            )
+            with tracer.span("schema.load", {"devices.schema": self.schema.__name__}):
+                return self._transport.load(
+                    response, self.schema.load, self.endpoint, "GET", started_at, customer_id=self._customer_id
+                )
 
 
 class CustomerDevices(Query):
@@ -43,8 +68,10 @@ class CustomerDevices(Query):
     schema = CustomerDeviceStatus
 
     def __init__(self, session, url, customer_id, **kwargs):
-        self._customer_id = customer_id
         super().__init__(session, url, **kwargs)
+        self._customer_id = customer_id
+        # Device statuses are large and repetitive, ask for them compressed
+        self._headers["Accept-Encoding"] = ACCEPT_ENCODING
 
     def filter_by(self, **kwargs):
         if kwargs:
@@ -1,15 +1,90 @@
-from requests import Session
+from requests.adapters import DEFAULT_POOLBLOCK, DEFAULT_POOLSIZE
 
-from devices.auth import Auth0Bearer
+from devices.auth0 import Auth0Client
+from devices.cache import NegativeCache
+from devices.circuit import CircuitBreaker
+from devices.coalescing import SingleFlight
+from devices.compression import CompressionStats
 from devices.errors import InvalidParamsError
+from devices.hedging import HedgingPolicy
+from devices.memory import MemoryAccounting
+from devices.metrics import Metrics
+from devices.profiling import SlowRequestProfiler
+from devices.ratelimit import RateLimiter
+from devices.retry import RetryPolicy
+from devices.session import DEFAULT_TIMEOUT, new_session, pool_stats, warm_up
+from devices.tracing import Tracer
+from devices.transport import BACKENDS, Transport
 from devices.v2.query import MDM, Assignment, Device, Devices, DownloadLink
 
 
 class DevicesV2API:
 
-    def __init__(self, url, auth_token):
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        url,
+        auth_token,
+        single_flight: SingleFlight = None,
+        negative_cache: NegativeCache = None,
+        retry_policy: RetryPolicy = None,
+        rate_limiter: RateLimiter = None,
+        circuit_breaker: CircuitBreaker = None,
+        compression_stats: CompressionStats = None,
+        hedging_policy: HedgingPolicy = None,
+        metrics: Metrics = None,
+        on_timings=None,
+        tracer: Tracer = None,
+        profiler: SlowRequestProfiler = None,
+        memory_accounting: MemoryAccounting = None,
+        timeout=DEFAULT_TIMEOUT,
+        pool_connections=DEFAULT_POOLSIZE,
+        pool_maxsize=DEFAULT_POOLSIZE,
+        pool_block=DEFAULT_POOLBLOCK,
+        keep_alive=True,
+        http2=False,
+        shared_transport=False,
+        warm_up_connections=0,
+        warm_up_background=False,
+        backend="requests",
+    ):
         self._url = url
-        self._session = self._new_session(auth_token)
+        self._session = self._new_session(
+            auth_token,
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+            keep_alive=keep_alive,
+            http2=http2,
+            shared_url=url if shared_transport else None,
+        )
+        self._single_flight = single_flight
+        self._negative_cache = negative_cache
+        self._transport = Transport(
+            BACKENDS[backend](self._session),
+            timeout=timeout,
+            retry_policy=retry_policy,
+            rate_limiter=rate_limiter,
+            circuit_breaker=circuit_breaker,
+            hedging_policy=hedging_policy,
+            compression_stats=compression_stats,
+            metrics=metrics,
+            on_timings=on_timings,
+            tracer=tracer,
+            profiler=profiler,
+            memory_accounting=memory_accounting,
+        )
+        if warm_up_connections:
+            self.warm_up(connections=warm_up_connections, background=warm_up_background)
+
+    @classmethod
+    def from_auth0(cls, url, auth0_client: Auth0Client, **kwargs):
+        """
+        Builds a client authenticated by ``auth0_client``, usually taken from
+        an ``Auth0TokenManager`` for the audience of this API. Tokens rejected
+        with a 401 are refreshed and the request is replayed once.
+        """
+        return cls(url, auth0_client, **kwargs)
 
     @property
     def session(self):
@@ -19,11 +94,66 @@ class DevicesV2API:
     def url(self):
         return self._url
 
+    @property
+    def transport(self):
+        return self._transport
+
+    @property
+    def metrics(self):
+        return self._transport.metrics
+
+    @property
+    def tracer(self):
+        return self._transport.tracer
+
+    @property
+    def single_flight(self):
+        return self._single_flight
+
+    @property
+    def negative_cache(self):
+        return self._negative_cache
+
+    @property
+    def retry_policy(self):
+        return self._transport.retry_policy
+
+    @property
+    def rate_limiter(self):
+        return self._transport.rate_limiter
+
+    @property
+    def circuit_breaker(self):
+        return self._transport.circuit_breaker
+
+    @property
+    def compression_stats(self):
+        return self._transport.compression_stats
+
+    @property
+    def hedging_policy(self):
+        return self._transport.hedging_policy
+
+    @property
+    def timeout(self):
+        return self._transport.timeout
+
     @staticmethod
-    def _new_session(auth_token):
-        session = Session()
-        session.auth = Auth0Bearer(auth_token)
-        return session
+    def _new_session(auth_token, **pool_options):
+        return new_session(auth_token, **pool_options)
+
+    def pool_stats(self):
+        return pool_stats(self._session)
+
+    def warm_up(self, connections=1, background=False):
+        """
+        Opens ``connections`` to the API, and to the Auth0 token endpoint when
+        authenticated by an ``Auth0Client``, before the first request.
+        """
+        auth0_client = getattr(self._session.auth, "provider", None)
+        if hasattr(auth0_client, "warm_up"):
+            auth0_client.warm_up(background=background)
+        return warm_up(self._session, self._url, connections=connections, background=background)
 
     def __enter__(self):
         return self
@@ -31,6 +161,15 @@ class DevicesV2API:
     def __exit__(self, *_):
         self._session.close()
 
+    def _query_kwargs(self):
+        return dict(
+            session=self._session,
+            url=self._url,
+            single_flight=self._single_flight,
+            negative_cache=self._negative_cache,
+            transport=self._transport,
+        )
+
     # jx
     #def devices(self, customer_id, assigned_to=None) -> Devices:
     def devices(self, customer_id) -> Devices:
@@ -38,8 +177,7 @@ class DevicesV2API:
             raise InvalidParamsError("customer_id is needed to query API-devices")
 
         return Devices(
-            session=self._session,
-            url=self._url,
+            **self._query_kwargs(),
             customer_id=customer_id,
             #assigned_to=assigned_to,
         )
@@ -49,8 +187,7 @@ class DevicesV2API:
             raise InvalidParamsError("Both customer_id and device_id are needed to query API-Devices")
 
         return Device(
-            session=self._session,
-            url=self._url,
+            **self._query_kwargs(),
             customer_id=customer_id,
             device_id=device_id,
         )
@@ -60,8 +197,7 @@ class DevicesV2API:
             raise InvalidParamsError("customer_id is needed to query API-devices")
 
         return MDM(
-            session=self._session,
-            url=self._url,
+            **self._query_kwargs(),
             customer_id=customer_id,
         )
 
@@ -70,8 +206,7 @@ class DevicesV2API:
             raise InvalidParamsError("customer_id is needed to query API-devices")
 
         return DownloadLink(
-            session=self._session,
-            url=self._url,
+            **self._query_kwargs(),
             customer_id=customer_id,
         )
 
@@ -80,8 +215,7 @@ class DevicesV2API:
             raise InvalidParamsError("Both customer_id and employee_ids are needed to query API-Devices")
 
         return Assignment(
-            session=self._session,
-            url=self._url,
+            **self._query_kwargs(),
             customer_id=customer_id,
             employee_ids=employee_ids,
         )
@@ -36,7 +36,7 @@ class APIDevicesV2Error(Exception):
             code = error.code
             detail = error.detail
             source = error.source
-        except ValidationError:
+        except (ValidationError, ValueError):
             code = "unknown"
             detail = str(http_error)
             source = None
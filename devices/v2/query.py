@@ -1,8 +1,11 @@
+import time
 from enum import Enum
+from http import HTTPStatus
 
-from requests import HTTPError
-
+from devices.compression import ACCEPT_ENCODING
+from devices.deadline import Deadline
 from devices.errors import InvalidParamsError
+from devices.transport import RequestsBackend, Transport
 from devices.v2.errors import APIDevicesV2Error
 from devices.v2.schemas import (
     AssignmentResponse,
@@ -27,6 +30,9 @@ class DevicesV2Endpoint(str, Enum):
     # Assignments
     ASSIGNMENTS_REQUEST = "/v2/assignments/request"
 
+    def __str__(self):
+        return self.value
+
 
 class FilterByOperator(str, Enum):
     AND = "and"
@@ -40,10 +46,30 @@ class Order(str, Enum):
 
 class Query:  # pylint: disable=too-few-public-methods
 
-    def __init__(self, session, url):
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        session,
+        url,
+        single_flight=None,
+        negative_cache=None,
+        deadline=None,
+        transport=None,
+        **transport_options,
+    ):
+        """
+        Requests go through ``transport``, shared by every query of a client.
+        Without it one is built for ``session`` from ``transport_options``
+        (``timeout``, ``retry_policy``, ``rate_limiter``, ...).
+        """
         self._session = session
         self._url = url
+        self._single_flight = single_flight
+        self._negative_cache = negative_cache
+        self._deadline = deadline
+        self._transport = transport or Transport(RequestsBackend(session), **transport_options)
         self._query_parameters = {}
+        self._headers = {}
 
     @property
     def session(self):
@@ -57,28 +83,101 @@ class Query:  # pylint: disable=too-few-public-methods
     def query_parameters(self):
         return self._query_parameters
 
-    def execute_request(self, resource, method="GET", schema=None, payload=None):
+    @property
+    def single_flight(self):
+        return self._single_flight
+
+    @property
+    def negative_cache(self):
+        return self._negative_cache
+
+    @property
+    def transport(self):
+        return self._transport
+
+    @property
+    def retry_policy(self):
+        return self._transport.retry_policy
+
+    @property
+    def rate_limiter(self):
+        return self._transport.rate_limiter
+
+    @property
+    def timeout(self):
+        return self._transport.timeout
+
+    @property
+    def circuit_breaker(self):
+        return self._transport.circuit_breaker
+
+    @property
+    def compression_stats(self):
+        return self._transport.compression_stats
+
+    @property
+    def hedging_policy(self):
+        return self._transport.hedging_policy
+
+    def deadline(self, seconds):
+        """
+        Limits the whole operation (every page and retry it needs) to
+        ``seconds``, counting from now. Token requests to Auth0 are bounded by
+        the ``timeout`` of the ``Auth0Client`` instead.
+        """
+        if seconds:
+            self._deadline = seconds if isinstance(seconds, Deadline) else Deadline(seconds)
+        return self
+
+    # pylint: disable=too-many-arguments
+    def execute_request(self, resource, method="GET", schema=None, payload=None, endpoint=None):
+        """
+        ``endpoint`` is the ``DevicesV2Endpoint`` the resource belongs to,
+        used to apply per endpoint policies. Defaults to the resource itself.
+        """
         url = f"{self._url}{resource}"
-        try:
-            response = self._session.request(
-                method=method,
-                url=url,
-                params=self._query_parameters,
-                json=payload,
-            )
-            response.raise_for_status()
-            return schema.load(response.json()) if schema else None
-        except HTTPError as err:
-            raise APIDevicesV2Error.wrap(err)
+        endpoint = endpoint or resource
+        with self._transport.tracer.span(f"{method} {endpoint}", {"devices.resource": str(resource)}):
+            if method == "GET" and self._single_flight is not None:
+                # Concurrent identical GETs of the same session (and so credentials) share one
+                # in flight request and its result
+                key = (id(self._session), url, tuple(sorted(self._query_parameters.items())), schema)
+                return self._single_flight.do(
+                    key,
+                    lambda: self._send(url, method, schema, payload, endpoint),
+                    deadline=self._deadline,
+                )
+            return self._send(url, method, schema, payload, endpoint)
+
+    # pylint: disable=too-many-arguments
+    def _send(self, url, method, schema, payload, endpoint):
+        started_at = time.perf_counter()
+        response = self._transport.request(
+            method,
+            url,
+            params=self._query_parameters,
+            json=payload,
+            headers=self._headers,
+            endpoint=endpoint,
+            deadline=self._deadline,
+            error=APIDevicesV2Error,
+        )
+        if schema is None:
+            return None
+        with self._transport.tracer.span("schema.load", {"devices.schema": schema.__name__}):
+            customer_id = self._query_parameters.get("customerId", getattr(self, "customer_id", None))
+            return self._transport.load(response, schema.load, endpoint, method, started_at, customer_id)
 
 
 class Devices(Query):
 
     #jx
     #def __init__(self, session, url, customer_id, assigned_to=None):
-    def __init__(self, session, url, customer_id):
-        super().__init__(session, url)
+    def __init__(self, session, url, customer_id, **kwargs):
+        super().__init__(session, url, **kwargs)
         self._query_parameters["customerId"] = customer_id
+        # Device pages are large and repetitive, ask for them compressed
+        self._headers["Accept-Encoding"] = ACCEPT_ENCODING
         #self._query_parameters["assignedTo"] = assigned_to
 
     #jx
@@ -122,22 +221,66 @@ class Devices(Query):
         return self.execute_request(
             DevicesV2Endpoint.DEVICES,
             schema=DevicesResponse,
+            endpoint=DevicesV2Endpoint.DEVICES,
         )
 
+    def pages(self):
+        """
+        Yields every page of devices, starting from the current one and
+        following the ``after`` cursor until the last page.
+
+        The iteration is traced as one span with a child span per page.
+        """
+        tracer = self._transport.tracer
+        span = tracer.start_span("devices.pages", {"devices.customer_id": str(self._query_parameters["customerId"])})
+        try:
+            number = 0
+            while True:
+                with tracer.span("devices.page", {"devices.page": number}, parent=span):
+                    page = self.all()
+                yield page
+                if not page.after:
+                    return
+                self._query_parameters["after"] = page.after
+                number += 1
+        except Exception as err:
+            span.record_exception(err)
+            raise
+        finally:
+            span.set_attribute("devices.pages", number + 1)
+            span.end()
+
 
 class DeviceAssignment(Query):
 
-    def __init__(self, session, url, host_identifier):
-        super().__init__(session, url)
+    def __init__(self, session, url, host_identifier, **kwargs):
+        super().__init__(session, url, **kwargs)
         self.host_identifier = host_identifier
 
     def get(self):
+        if self._negative_cache is not None:
+            # Serve recent 404s locally instead of doing the round trip again
+            not_found = self._negative_cache.get(self.host_identifier)
+            if not_found is not None:
+                raise APIDevicesV2Error(
+                    code=not_found.code,
+                    detail=not_found.detail,
+                    source=not_found.source,
+                    status_code=not_found.status_code,
+                )
+
         resource = DevicesV2Endpoint.DEVICE_ASSIGNMENT.format(id=self.host_identifier)
-        return self.execute_request(
-            resource,
-            method="GET",
-            schema=AssignmentResponse,
-        )
+        try:
+            return self.execute_request(
+                resource,
+                method="GET",
+                schema=AssignmentResponse,
+                endpoint=DevicesV2Endpoint.DEVICE_ASSIGNMENT,
+            )
+        except APIDevicesV2Error as err:
+            if self._negative_cache is not None and err.status_code == HTTPStatus.NOT_FOUND:
+                self._negative_cache.set(self.host_identifier, err)
+            raise
 
     def create(self, assigned_to, assigned_by):
         assignment = CreateAssignmentPayload(
@@ -145,24 +288,29 @@ class DeviceAssignment(Query):
             assigned_by=assigned_by,
         )
         resource = DevicesV2Endpoint.DEVICE_ASSIGNMENT.format(id=self.host_identifier)
-        return self.execute_request(
+        response = self.execute_request(
             resource,
             method="PUT",
             payload=assignment.dump(),
+            endpoint=DevicesV2Endpoint.DEVICE_ASSIGNMENT,
         )
+        if self._negative_cache is not None:
+            self._negative_cache.invalidate(self.host_identifier)
+        return response
 
     def delete(self):
         resource = DevicesV2Endpoint.DEVICE_ASSIGNMENT.format(id=self.host_identifier)
         return self.execute_request(
             resource,
             method="DELETE",
+            endpoint=DevicesV2Endpoint.DEVICE_ASSIGNMENT,
         )
 
 
 class Device(Query):
 
-    def __init__(self, session, url, customer_id, device_id):
-        super().__init__(session, url)
+    def __init__(self, session, url, customer_id, device_id, **kwargs):
+        super().__init__(session, url, **kwargs)
         self.device_id = device_id
         self.customer_id = customer_id
 
@@ -174,13 +322,17 @@ class Device(Query):
             session=self._session,
             url=self._url,
             host_identifier=self._host_identifier(),
+            single_flight=self._single_flight,
+            negative_cache=self._negative_cache,
+            deadline=self._deadline,
+            transport=self._transport,
         )
 
 
 class MDM(Query):
 
-    def __init__(self, session, url, customer_id):
-        super().__init__(session, url)
+    def __init__(self, session, url, customer_id, **kwargs):
+        super().__init__(session, url, **kwargs)
         self.customer_id = customer_id
 
     def get(self, name):
@@ -195,6 +347,7 @@ class MDM(Query):
             resource=resource,
             method="GET",
             schema=MDMResponse,
+            endpoint=DevicesV2Endpoint.CUSTOMER_MDM,
         )
 
     def create(self, name):
@@ -207,13 +360,14 @@ class MDM(Query):
             method="POST",
             payload=create_mdm_payload.dump(),
             schema=MDMResponse,
+            endpoint=DevicesV2Endpoint.MDM,
         )
 
 
 class DownloadLink(Query):
 
-    def __init__(self, session, url, customer_id):
-        super().__init__(session, url)
+    def __init__(self, session, url, customer_id, **kwargs):
+        super().__init__(session, url, **kwargs)
         self.customer_id = customer_id
 
     def get(self):
@@ -222,13 +376,14 @@ class DownloadLink(Query):
             resource=resource,
             method="GET",
             schema=DownloadLinkResponse,
+            endpoint=DevicesV2Endpoint.DOWNLOAD_LINK,
         )
 
 
 class Assignment(Query):
 
-    def __init__(self, session, url, customer_id, employee_ids):
-        super().__init__(session, url)
+    def __init__(self, session, url, customer_id, employee_ids, **kwargs):
+        super().__init__(session, url, **kwargs)
         self.customer_id = customer_id
         self.employee_ids = employee_ids
 
@@ -242,4 +397,5 @@ class Assignment(Query):
             resource=resource,
             method="POST",
             payload=request.dump(),
+            endpoint=DevicesV2Endpoint.ASSIGNMENTS_REQUEST,
         )
@@ -22,5 +22,6 @@ setuptools.setup(
     url='https://github.com/gibil5/api-devices-client',
     packages=setuptools.find_packages(exclude=("tests", "tests.*")),
     install_requires=requirements,
+    extras_require={"http2": ["httpx[http2]>=0.23.0"], "tracing": ["opentelemetry-api>=1.0.0"]},
     classifiers=[],
 )
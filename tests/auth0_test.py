@@ -0,0 +1,293 @@
+import asyncio
+import gc
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytest
+import requests
+import responses
+
+from devices.auth0 import Auth0Client, Auth0TokenManager
+from devices.settings import AUTH0_URL
+from devices.token_store import FileTokenStore, StoredToken
+from tests.mocks.response import http_200_callback, http_401_callback
+
+
+@responses.activate
+def test_token_is_requested_and_reused(auth0_client):
+    # Given
+    responses.add_callback(
+        responses.POST,
+        AUTH0_URL,
+        callback=http_200_callback(body=dict(access_token="some_token", expires_in=3600)),
+    )
+
+    # When
+    first = auth0_client.token
+    second = auth0_client.token
+
+    # Then
+    assert first == second == "some_token"
+    assert len(responses.calls) == 1
+
+
+@responses.activate
+def test_token_is_refreshed_after_expiration(auth0_client):
+    # Given
+    responses.add_callback(
+        responses.POST,
+        AUTH0_URL,
+        callback=http_200_callback(body=dict(access_token="some_token", expires_in=3600)),
+    )
+    _ = auth0_client.token
+
+    # When
+    auth0_client._expiration_date = datetime.now() - timedelta(seconds=1)
+    _ = auth0_client.token
+
+    # Then
+    assert len(responses.calls) == 2
+
+
+@responses.activate
+def test_token_request_has_a_timeout():
+    # Given
+    timeouts = []
+    session = requests.Session()
+    post = session.post
+
+    def timed_post(*args, **kwargs):
+        timeouts.append(kwargs["timeout"])
+        return post(*args, **kwargs)
+
+    session.post = timed_post
+    auth0_client = Auth0Client(token_store=None, session=session, timeout=(1, 2))
+    responses.add_callback(
+        responses.POST,
+        AUTH0_URL,
+        callback=http_200_callback(body=dict(access_token="some_token", expires_in=3600)),
+    )
+
+    # When
+    _ = auth0_client.token
+
+    # Then
+    assert timeouts == [(1, 2)]
+
+
+@responses.activate
+def test_token_request_failure(auth0_client):
+    # Given
+    responses.add_callback(responses.POST, AUTH0_URL, callback=http_401_callback())
+
+    # When/Then
+    with pytest.raises(Exception, match="Failed to get Auth0 Token"):
+        _ = auth0_client.token
+
+
+@responses.activate
+def test_concurrent_token_refresh_is_single_flight(auth0_client):
+    # Given
+    release = threading.Event()
+    callback = http_200_callback(body=dict(access_token="some_token", expires_in=3600))
+
+    def slow_callback(request):
+        release.wait(timeout=5)
+        return callback(request)
+
+    responses.add_callback(responses.POST, AUTH0_URL, callback=slow_callback)
+
+    # When
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        futures = [executor.submit(lambda: auth0_client.token) for _ in range(8)]
+        release.wait(0.2)
+        release.set()
+        tokens = [future.result() for future in futures]
+
+    # Then
+    assert tokens == ["some_token"] * 8
+    assert len(responses.calls) == 1
+
+
+@responses.activate
+def test_concurrent_async_token_refresh_is_single_flight(auth0_client):
+    # Given
+    responses.add_callback(
+        responses.POST,
+        AUTH0_URL,
+        callback=http_200_callback(body=dict(access_token="some_token", expires_in=3600)),
+    )
+
+    async def get_tokens():
+        return await asyncio.gather(*[auth0_client.get_token() for _ in range(8)])
+
+    # When
+    tokens = asyncio.run(get_tokens())
+
+    # Then
+    assert tokens == ["some_token"] * 8
+    assert len(responses.calls) == 1
+
+
+@responses.activate
+def test_refresh_ahead_renews_token_in_background(auth0_client):
+    # Given
+    tokens = iter([("first_token", 2), ("second_token", 3600)])
+
+    def callback(request):
+        access_token, expires_in = next(tokens)
+        return http_200_callback(body=dict(access_token=access_token, expires_in=expires_in))(request)
+
+    responses.add_callback(responses.POST, AUTH0_URL, callback=callback)
+    auth0_client.enable_refresh_ahead(ratio=0.05, jitter=0)
+
+    # When
+    first = auth0_client.token
+    for _ in range(500):
+        if len(responses.calls) == 2:
+            break
+        threading.Event().wait(0.01)
+
+    # Then
+    assert first == "first_token"
+    assert auth0_client.token == "second_token"
+    assert len(responses.calls) == 2
+
+
+@responses.activate
+def test_refresh_ahead_does_not_keep_dropped_clients_alive():
+    # Given
+    responses.add_callback(
+        responses.POST,
+        AUTH0_URL,
+        callback=http_200_callback(body=dict(access_token="some_token", expires_in=3600)),
+    )
+    auth0_client = Auth0Client(token_store=None)
+    auth0_client.enable_refresh_ahead(ratio=0.5, jitter=0)
+    _ = auth0_client.token
+    timer = auth0_client._refresh_timer
+    client_ref = weakref.ref(auth0_client)
+
+    # When
+    del auth0_client
+    gc.collect()
+
+    # Then
+    assert client_ref() is None
+    timer.cancel()
+
+
+def test_close_stops_refresh_ahead():
+    # Given
+    with Auth0Client(token_store=None) as auth0_client:
+        auth0_client._set_token("some_token", datetime.now(), 3600)
+        auth0_client.enable_refresh_ahead(ratio=0.5, jitter=0)
+        timer = auth0_client._refresh_timer
+
+    # Then
+    assert auth0_client._refresh_timer is None
+    assert timer.finished.is_set()
+
+
+def test_refresh_ahead_invalid_ratio(auth0_client):
+    # When/Then
+    with pytest.raises(ValueError):
+        auth0_client.enable_refresh_ahead(ratio=1.5)
+
+
+@responses.activate
+def test_token_is_shared_through_the_token_store(auth0_client, token_store_path):
+    # Given
+    responses.add_callback(
+        responses.POST,
+        AUTH0_URL,
+        callback=http_200_callback(body=dict(access_token="some_token", expires_in=3600)),
+    )
+    auth0_client.token_store = FileTokenStore(token_store_path)
+    _ = auth0_client.token
+
+    # When (another process starts with an empty client)
+    another_client = Auth0Client(token_store=FileTokenStore(token_store_path))
+
+    # Then
+    assert another_client.token == "some_token"
+    assert len(responses.calls) == 1
+
+
+@responses.activate
+def test_expired_token_in_the_token_store_is_not_used(auth0_client, token_store_path):
+    # Given
+    responses.add_callback(
+        responses.POST,
+        AUTH0_URL,
+        callback=http_200_callback(body=dict(access_token="new_token", expires_in=3600)),
+    )
+    store = FileTokenStore(token_store_path)
+    store.save(
+        auth0_client._token_store_key(),
+        StoredToken(access_token="old_token", issued_at=time.time() - 7200, expires_in=3600),
+    )
+    auth0_client.token_store = store
+
+    # When
+    token = auth0_client.token
+
+    # Then
+    assert token == "new_token"
+    assert store.load(auth0_client._token_store_key()).access_token == "new_token"
+
+
+@responses.activate
+def test_invalidate_replaces_the_stale_token_once(auth0_client):
+    # Given
+    tokens = iter(["first_token", "second_token"])
+    responses.add_callback(
+        responses.POST,
+        AUTH0_URL,
+        callback=lambda request: http_200_callback(body=dict(access_token=next(tokens), expires_in=3600))(request),
+    )
+    _ = auth0_client.token
+
+    # When
+    auth0_client.invalidate("first_token")
+    auth0_client.invalidate("first_token")
+
+    # Then
+    assert auth0_client.token == "second_token"
+    assert len(responses.calls) == 2
+
+
+@responses.activate
+def test_token_manager_caches_tokens_per_client_and_audience():
+    # Given
+    tokens = iter(["first_token", "second_token"])
+    responses.add_callback(
+        responses.POST,
+        AUTH0_URL,
+        callback=lambda request: http_200_callback(body=dict(access_token=next(tokens), expires_in=3600))(request),
+    )
+
+    with Auth0TokenManager(token_store=None) as token_manager:
+        # When
+        first = token_manager.token(client_id="client", client_secret="secret", audience="first_audience")
+        second = token_manager.token(client_id="client", client_secret="secret", audience="second_audience")
+        first_again = token_manager.token(client_id="client", client_secret="secret", audience="first_audience")
+
+        # Then
+        assert (first, second, first_again) == ("first_token", "second_token", "first_token")
+        assert len(responses.calls) == 2
+        assert "audience=first_audience" in responses.calls[0].request.body
+        assert "audience=second_audience" in responses.calls[1].request.body
+
+        first_client = token_manager.client(client_id="client", client_secret="secret", audience="first_audience")
+        assert first_client.key == (AUTH0_URL, "client", "first_audience")
+        assert first_client._session is token_manager.session
+
+
+@pytest.fixture(name="auth0_client")
+def get_auth0_client():
+    with Auth0Client(token_store=None) as auth0_client:
+        yield auth0_client
@@ -19,6 +19,30 @@ def test_missing_token():
         _ = Auth0Bearer(token=None)
 
 
+def test_bearer_token_provider(auth_token):
+    # Given
+    provider = TokenProvider(auth_token)
+    auth0_bearer = Auth0Bearer(provider)
+    some_request = Request()
+
+    # When
+    provider.token = "aRotatedToken"
+    auth0_bearer(some_request)
+
+    # Then
+    assert some_request.headers["Authorization"] == "Bearer aRotatedToken"
+
+
+def test_bearer_token_refresh(auth_token):
+    # Given
+    provider = TokenProvider(auth_token)
+
+    # When / Then
+    assert Auth0Bearer(provider).refresh(stale_token=auth_token)
+    assert provider.invalidated == [auth_token]
+    assert not Auth0Bearer(auth_token).refresh(stale_token=auth_token)
+
+
 @pytest.fixture
 def auth_token():
     return "aRandomBearerTokenForAuth0Authentication"
@@ -26,3 +50,13 @@ def auth_token():
 
 class Request:
     headers: dict = {}
+
+
+class TokenProvider:
+
+    def __init__(self, token):
+        self.token = token
+        self.invalidated = []
+
+    def invalidate(self, stale_token=None):
+        self.invalidated.append(stale_token)
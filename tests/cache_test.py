@@ -0,0 +1,54 @@
+from devices.cache import NegativeCache
+
+
+def test_negative_cache_get_set(clock):
+    # Given
+    cache = NegativeCache(ttl=10, clock=clock)
+
+    # When
+    cache.set("key", "value")
+
+    # Then
+    assert cache.get("key") == "value"
+    assert cache.get("missing") is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "size": 1}
+
+
+def test_negative_cache_expiration(clock):
+    # Given
+    cache = NegativeCache(ttl=10, clock=clock)
+    cache.set("key", "value")
+
+    # When
+    clock.advance(10)
+
+    # Then
+    assert cache.get("key") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_negative_cache_invalidate(clock):
+    # Given
+    cache = NegativeCache(ttl=10, clock=clock)
+    cache.set("key", "value")
+
+    # When
+    cache.invalidate("key")
+
+    # Then
+    assert cache.get("key") is None
+
+
+def test_negative_cache_evicts_oldest_entry(clock):
+    # Given
+    cache = NegativeCache(ttl=10, maxsize=2, clock=clock)
+
+    # When
+    cache.set("first", 1)
+    cache.set("second", 2)
+    cache.set("third", 3)
+
+    # Then
+    assert cache.get("first") is None
+    assert cache.get("second") == 2
+    assert cache.get("third") == 3
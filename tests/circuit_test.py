@@ -0,0 +1,116 @@
+import pytest
+
+from devices.circuit import CircuitBreaker, CircuitState
+from devices.errors import CircuitOpenError
+
+_ENDPOINT = "/v2/devices"
+
+
+def test_circuit_opens_after_consecutive_failures(clock):
+    # Given
+    breaker = CircuitBreaker(failure_threshold=3, recovery_timeout=10, clock=clock)
+
+    # When
+    for _ in range(3):
+        breaker.allow(_ENDPOINT)
+        breaker.record(_ENDPOINT, success=False)
+
+    # Then
+    assert breaker.state(_ENDPOINT) == CircuitState.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.allow(_ENDPOINT)
+    assert breaker.stats()[_ENDPOINT] == dict(state="open", failures=3, opened=1, rejected=1)
+
+
+def test_circuit_success_resets_failures(clock):
+    # Given
+    breaker = CircuitBreaker(failure_threshold=2, clock=clock)
+
+    # When
+    breaker.record(_ENDPOINT, success=False)
+    breaker.record(_ENDPOINT, success=True)
+    breaker.record(_ENDPOINT, success=False)
+
+    # Then
+    assert breaker.state(_ENDPOINT) == CircuitState.CLOSED
+
+
+def test_circuit_is_per_endpoint(clock):
+    # Given
+    breaker = CircuitBreaker(failure_threshold=1, clock=clock)
+
+    # When
+    breaker.record(_ENDPOINT, success=False)
+
+    # Then
+    assert breaker.state(_ENDPOINT) == CircuitState.OPEN
+    assert breaker.state("/v2/mdm") == CircuitState.CLOSED
+    breaker.allow("/v2/mdm")
+
+
+def test_circuit_counts_slow_calls_as_failures(clock):
+    # Given
+    breaker = CircuitBreaker(failure_threshold=2, slow_call_threshold=1, clock=clock)
+
+    # When
+    breaker.record(_ENDPOINT, success=True, latency=0.5)
+    breaker.record(_ENDPOINT, success=True, latency=2)
+    breaker.record(_ENDPOINT, success=True, latency=3)
+
+    # Then
+    assert breaker.state(_ENDPOINT) == CircuitState.OPEN
+
+
+def test_circuit_half_open_probe_closes(clock):
+    # Given
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=10, half_open_probes=1, clock=clock)
+    breaker.record(_ENDPOINT, success=False)
+
+    # When
+    clock.advance(10)
+    breaker.allow(_ENDPOINT)
+
+    # Then only one probe goes through while half open
+    assert breaker.state(_ENDPOINT) == CircuitState.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.allow(_ENDPOINT)
+
+    # When
+    breaker.record(_ENDPOINT, success=True)
+
+    # Then
+    assert breaker.state(_ENDPOINT) == CircuitState.CLOSED
+    breaker.allow(_ENDPOINT)
+
+
+def test_circuit_half_open_probe_failure_reopens(clock):
+    # Given
+    breaker = CircuitBreaker(failure_threshold=5, recovery_timeout=10, clock=clock)
+    for _ in range(5):
+        breaker.record(_ENDPOINT, success=False)
+    clock.advance(10)
+    breaker.allow(_ENDPOINT)
+
+    # When
+    breaker.record(_ENDPOINT, success=False)
+
+    # Then
+    assert breaker.state(_ENDPOINT) == CircuitState.OPEN
+    assert breaker.stats()[_ENDPOINT]["opened"] == 2
+    with pytest.raises(CircuitOpenError):
+        breaker.allow(_ENDPOINT)
+
+
+def test_circuit_released_probe_can_be_taken_again(clock):
+    # Given
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=10, clock=clock)
+    breaker.record(_ENDPOINT, success=False)
+    clock.advance(10)
+    breaker.allow(_ENDPOINT)
+
+    # When
+    breaker.release(_ENDPOINT)
+
+    # Then
+    breaker.allow(_ENDPOINT)
+    assert breaker.state(_ENDPOINT) == CircuitState.HALF_OPEN
@@ -0,0 +1,97 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from devices.coalescing import SingleFlight
+from devices.deadline import Deadline
+from devices.errors import DeadlineExceededError
+
+
+def test_single_flight_runs_function_once_for_concurrent_callers():
+    # Given
+    single_flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        release.wait(timeout=5)
+        return {"some": "result"}
+
+    # When
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        futures = [executor.submit(single_flight.do, "key", fn) for _ in range(5)]
+        _wait_for(lambda: single_flight.coalesced == 4)
+        release.set()
+        results = [future.result() for future in futures]
+
+    # Then
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert single_flight.stats() == {"executed": 1, "coalesced": 4, "in_flight": 0}
+
+
+def test_single_flight_shares_exceptions():
+    # Given
+    single_flight = SingleFlight()
+    release = threading.Event()
+
+    def fn():
+        release.wait(timeout=5)
+        raise ValueError("boom")
+
+    # When
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        futures = [executor.submit(single_flight.do, "key", fn) for _ in range(3)]
+        _wait_for(lambda: single_flight.coalesced == 2)
+        release.set()
+
+        # Then
+        for future in futures:
+            with pytest.raises(ValueError):
+                future.result()
+
+
+def test_single_flight_does_not_cache_finished_calls():
+    # Given
+    single_flight = SingleFlight()
+
+    # When
+    first = single_flight.do("key", lambda: 1)
+    second = single_flight.do("key", lambda: 2)
+
+    # Then
+    assert (first, second) == (1, 2)
+    assert single_flight.executed == 2
+    assert single_flight.coalesced == 0
+
+
+def test_single_flight_waiters_honour_their_deadline():
+    # Given
+    single_flight = SingleFlight()
+    release = threading.Event()
+
+    def fn():
+        release.wait(timeout=5)
+        return 1
+
+    # When
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        leader = executor.submit(single_flight.do, "key", fn)
+        _wait_for(lambda: single_flight.stats()["in_flight"] == 1)
+
+        # Then
+        with pytest.raises(DeadlineExceededError):
+            single_flight.do("key", fn, deadline=Deadline(0.05))
+        release.set()
+        assert leader.result() == 1
+
+
+def _wait_for(condition, timeout=5):
+    done = threading.Event()
+    for _ in range(int(timeout * 100)):
+        if condition():
+            return
+        done.wait(0.01)
+    raise AssertionError("Condition not met in time")
@@ -0,0 +1,58 @@
+import gzip
+import json
+
+import responses
+from requests import Session
+
+from devices.compression import ACCEPT_ENCODING, CompressionStats
+
+_URL = "https://devices.test/v2/devices"
+
+
+@responses.activate
+def test_compression_stats_gzip():
+    # Given
+    body = json.dumps({"data": [{"serial_number": "C02XK1JYJGH5"}] * 100}).encode()
+    responses.add(
+        responses.GET,
+        _URL,
+        body=gzip.compress(body),
+        headers={"Content-Encoding": "gzip"},
+        content_type="application/json",
+    )
+    compression_stats = CompressionStats()
+
+    # When
+    response = Session().get(_URL)
+    compression_stats.record("/v2/devices", response)
+
+    # Then
+    assert response.content == body
+    stats = compression_stats.stats()["/v2/devices"]
+    assert stats["responses"] == 1
+    assert stats["compressed_responses"] == 1
+    assert stats["uncompressed_bytes"] == len(body)
+    assert stats["compressed_bytes"] == len(gzip.compress(body))
+    assert stats["ratio"] > 10
+
+
+@responses.activate
+def test_compression_stats_identity():
+    # Given
+    responses.add(responses.GET, _URL, json={"ok": True})
+    compression_stats = CompressionStats()
+
+    # When
+    for _ in range(2):
+        compression_stats.record("/v2/devices", Session().get(_URL))
+
+    # Then
+    stats = compression_stats.stats()["/v2/devices"]
+    assert stats["responses"] == 2
+    assert stats["compressed_responses"] == 0
+    assert stats["compressed_bytes"] == stats["uncompressed_bytes"]
+    assert stats["ratio"] == 1
+
+
+def test_accept_encoding():
+    assert ACCEPT_ENCODING.startswith("gzip")
@@ -1,6 +1,12 @@
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
 import pytest
 
 from devices.auth0 import Auth0Client
+from devices.token_store import FileTokenStore
 
 
 @pytest.fixture(name="customer_id", scope="session")
@@ -29,8 +35,154 @@ def get_url_staging():
 
 
 @pytest.fixture(name="auth_token_staging", scope="session")
-def get_auth_token_staging():
+def get_auth_token_staging(tmp_path_factory):
     # Authentication.
-    # This instantiation is using a singleton, thus this is not creating a new object
-    auth_client = Auth0Client()
-    return auth_client.token
+    # Tokens are shared by the tests of the session, not with the rest of the host
+    token_store = FileTokenStore(str(tmp_path_factory.mktemp("auth0") / "tokens.json"))
+    with Auth0Client(token_store=token_store) as auth_client:
+        return auth_client.token
+
+
+@pytest.fixture(name="token_store_path")
+def get_token_store_path(tmp_path):
+    return str(tmp_path / "tokens.json")
+
+
+@pytest.fixture(name="clock")
+def get_clock():
+    return FakeClock()
+
+
+class FakeClock:
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+
+
+@pytest.fixture(name="http_server")
+def get_http_server():
+    """
+    Local HTTP/1.1 server answering requests with ``LocalHandler.body`` as JSON,
+    for tests that need real connections (responses bypasses the connection pools).
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), LocalHandler)
+    thread = threading.Thread(target=server.serve_forever, kwargs=dict(poll_interval=0.05), daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+class LocalHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    body = {"ok": True}
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """
+        ``/echo`` answers with the request, ``/status/<code>`` with that status.
+        """
+        status = 200
+        body = self.body
+        if self.path.startswith("/echo"):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = {
+                "method": self.command,
+                "path": self.path,
+                "headers": dict(self.headers),
+                "body": self.rfile.read(length).decode() if length else None,
+            }
+        elif self.path.startswith("/status/"):
+            status = int(self.path.split("/")[2])
+            body = {"code": "error", "detail": f"status {status}", "source": None}
+
+        body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_POST = do_PUT = do_DELETE = do_GET
+
+    def log_message(self, *_):  # pylint: disable=arguments-differ
+        pass
+
+
+@pytest.fixture(name="http2_server")
+def get_http2_server():
+    """
+    Local cleartext HTTP/2 (prior knowledge) server answering every request
+    with its ``body`` as JSON, counting the connections it accepted.
+    """
+    pytest.importorskip("h2")
+    server = LocalHTTP2Server()
+    yield server
+    server.close()
+
+
+class LocalHTTP2Server:
+
+    def __init__(self):
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind(("127.0.0.1", 0))
+        self._socket.listen()
+        self.url = f"http://127.0.0.1:{self._socket.getsockname()[1]}"
+        self.body = {"ok": True}
+        self.connections = 0
+        self.requests = 0
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                client, _ = self._socket.accept()
+            except OSError:
+                return
+            self.connections += 1
+            threading.Thread(target=self._handle, args=(client,), daemon=True).start()
+
+    def _handle(self, client):
+        # pylint: disable=import-outside-toplevel
+        import h2.config
+        import h2.connection
+        import h2.events
+
+        connection = h2.connection.H2Connection(config=h2.config.H2Configuration(client_side=False))
+        connection.initiate_connection()
+        client.sendall(connection.data_to_send())
+        with client:
+            while True:
+                data = client.recv(65535)
+                if not data:
+                    return
+                for event in connection.receive_data(data):
+                    if isinstance(event, h2.events.DataReceived):
+                        connection.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+                    elif isinstance(event, h2.events.StreamEnded):
+                        self.requests += 1
+                        body = json.dumps(self.body).encode()
+                        connection.send_headers(
+                            event.stream_id,
+                            [
+                                (":status", "200"),
+                                ("content-type", "application/json"),
+                                ("content-length", str(len(body))),
+                            ],
+                        )
+                        connection.send_data(event.stream_id, body, end_stream=True)
+                    elif isinstance(event, h2.events.ConnectionTerminated):
+                        return
+                client.sendall(connection.data_to_send())
+
+    def close(self):
+        self._socket.close()
@@ -0,0 +1,60 @@
+import pytest
+
+from devices.deadline import Deadline
+from devices.errors import DeadlineExceededError, RequestTimeoutError
+
+
+def test_deadline_remaining(clock):
+    # Given
+    deadline = Deadline(10, clock=clock)
+
+    # When
+    clock.advance(4)
+
+    # Then
+    assert deadline.remaining() == pytest.approx(6)
+    assert not deadline.expired
+
+
+def test_deadline_expired(clock):
+    # Given
+    deadline = Deadline(10, clock=clock)
+
+    # When
+    clock.advance(11)
+
+    # Then
+    assert deadline.remaining() == 0
+    assert deadline.expired
+    with pytest.raises(DeadlineExceededError) as err_info:
+        deadline.check()
+    assert isinstance(err_info.value, RequestTimeoutError)
+
+
+@pytest.mark.parametrize(
+    "timeout, expected",
+    [
+        (None, 3),
+        (1, 1),
+        (5, 3),
+        ((1, 60), (1, 3)),
+        ((None, 2), (3, 2)),
+    ],
+)
+def test_deadline_caps_timeout(clock, timeout, expected):
+    # Given
+    deadline = Deadline(10, clock=clock)
+    clock.advance(7)
+
+    # When/Then
+    assert deadline.timeout(timeout) == expected
+
+
+def test_deadline_timeout_when_expired(clock):
+    # Given
+    deadline = Deadline(1, clock=clock)
+    clock.advance(1)
+
+    # When/Then
+    with pytest.raises(DeadlineExceededError):
+        deadline.timeout((5, 60))
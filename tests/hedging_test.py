@@ -0,0 +1,121 @@
+import threading
+import time
+
+import pytest
+
+from devices.hedging import HedgingPolicy
+
+
+def test_no_hedge_when_fast():
+    # Given
+    policy = HedgingPolicy(initial_delay=1)
+    send = Sender(0)
+
+    # When
+    response = policy.call("/v2/devices", send)
+
+    # Then
+    assert response.attempt == 1
+    assert send.calls == 1
+    assert policy.stats() == dict(requests=1, hedged=0, hedge_wins=0, budget_exhausted=0)
+
+
+def test_hedge_wins_when_primary_is_slow():
+    # Given
+    policy = HedgingPolicy(initial_delay=0.05)
+    send = Sender(1, 0)
+
+    # When
+    response = policy.call("/v2/devices", send)
+
+    # Then
+    assert response.attempt == 2
+    assert send.calls == 2
+    assert policy.stats()["hedged"] == 1
+    assert policy.stats()["hedge_wins"] == 1
+
+    # The slow primary response is closed once it arrives
+    send.release()
+    assert send.responses[0].closed.wait(1)
+
+
+def test_hedge_budget_caps_extra_load():
+    # Given
+    policy = HedgingPolicy(initial_delay=0.01, min_samples=10, max_extra_load=0.1)
+
+    # When
+    for _ in range(3):
+        policy.call("/v2/devices", Sender(0.05, 0.05))
+
+    # Then
+    assert policy.stats()["hedged"] == 1
+    assert policy.stats()["budget_exhausted"] == 2
+
+
+def test_hedge_delay_percentile():
+    # Given
+    policy = HedgingPolicy(percentile=90, min_samples=10, initial_delay=5, min_delay=0)
+    assert policy.delay("/v2/devices") == 5
+
+    # When
+    for latency in range(10):
+        policy.call("/v2/devices", Sender(latency / 1000))
+
+    # Then
+    assert policy.delay("/v2/devices") == pytest.approx(0.009, abs=0.005)
+    assert policy.delay("/v2/mdm") == 5
+
+
+def test_hedge_errors_use_other_attempt():
+    # Given
+    policy = HedgingPolicy(initial_delay=0.01)
+    send = Sender(ConnectionError("reset"), 0)
+
+    # When
+    response = policy.call("/v2/devices", send)
+
+    # Then
+    assert response.attempt == 2
+
+
+class Response:
+
+    def __init__(self, attempt):
+        self.attempt = attempt
+        self.closed = threading.Event()
+
+    def close(self):
+        self.closed.set()
+
+
+class Sender:
+    """
+    Fake ``send`` whose attempts take the given seconds (or raise the given
+    error after a short wait). An attempt taking 1s or more blocks until ``release``.
+    """
+
+    def __init__(self, *outcomes):
+        self._outcomes = list(outcomes)
+        self._released = threading.Event()
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.responses = []
+
+    def release(self):
+        self._released.set()
+
+    def __call__(self):
+        with self._lock:
+            outcome = self._outcomes[min(self.calls, len(self._outcomes) - 1)]
+            self.calls += 1
+            response = Response(self.calls)
+            self.responses.append(response)
+
+        if isinstance(outcome, Exception):
+            time.sleep(0.02)
+            raise outcome
+        if outcome >= 1:
+            self._released.wait(5)
+        else:
+            time.sleep(outcome)
+        return response
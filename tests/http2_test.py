@@ -0,0 +1,98 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from requests.exceptions import ConnectionError as RequestsConnectionError
+
+from devices.session import new_session, pool_stats
+from devices.v2.client import DevicesV2API
+
+pytest.importorskip("httpx")
+
+from devices.http2 import HTTP2Adapter  # pylint: disable=wrong-import-position
+
+
+def test_new_session_http2(auth_token):
+    # Given / When
+    session = new_session(auth_token, pool_maxsize=4, http2=True)
+
+    # Then
+    assert isinstance(session.get_adapter("https://some.host"), HTTP2Adapter)
+    assert session.get_adapter("http://some.host") is session.get_adapter("https://some.host")
+
+
+def test_http2_request(auth_token, http2_server):
+    # Given
+    session = new_session(auth_token, http2=True, keep_alive=False)
+
+    # When
+    response = session.get(f"{http2_server.url}/v2/devices", params={"customerId": "a"})
+
+    # Then
+    response.raise_for_status()
+    assert response.http_version == "HTTP/2"
+    assert response.json() == {"ok": True}
+    assert http2_server.requests == 1
+
+
+def test_http2_requests_are_multiplexed(auth_token, http2_server, customer_id):
+    # Given
+    http2_server.body = {"after": None, "count": 0, "total": 0, "data": []}
+    client = DevicesV2API(http2_server.url, auth_token, http2=True)
+
+    # When
+    with client, ThreadPoolExecutor(max_workers=10) as executor:
+        pages = list(executor.map(lambda _: client.devices(customer_id).all(), range(30)))
+        stats = client.pool_stats()
+
+    # Then
+    assert all(page.count == 0 for page in pages)
+    assert http2_server.requests == 30
+    assert http2_server.connections <= 2
+    assert stats[http2_server.url]["requests"] == 30
+    assert stats[http2_server.url]["connections"] == http2_server.connections
+
+
+def test_http2_connection_error(auth_token):
+    # Given
+    session = new_session(auth_token, http2=True)
+
+    # When/Then
+    with pytest.raises(RequestsConnectionError):
+        session.get("http://127.0.0.1:1/v2/devices", timeout=1)
+
+    assert pool_stats(session) == {}
+
+
+def test_http2_client_certificate_not_supported(auth_token):
+    # Given
+    session = new_session(auth_token, http2=True)
+    session.cert = "client.pem"
+
+    # When/Then
+    with pytest.raises(ValueError, match="certificates"):
+        session.get("https://some.host/v2/devices")
+
+
+def test_http2_proxy_not_supported(auth_token):
+    # Given
+    session = new_session(auth_token, http2=True)
+
+    # When/Then
+    with pytest.raises(ValueError, match="Proxies"):
+        session.get("https://some.host/v2/devices", proxies={"https": "http://proxy.host:3128"})
+
+
+def test_http2_proxy_of_another_scheme_ignored(auth_token, http2_server):
+    # Given
+    session = new_session(auth_token, http2=True, keep_alive=False)
+
+    # When
+    response = session.get(f"{http2_server.url}/v2/devices", proxies={"https": "http://proxy.host:3128"})
+
+    # Then
+    assert response.json() == {"ok": True}
+
+
+@pytest.fixture(name="auth_token")
+def get_auth_token():
+    return "aRandomBearerTokenForAuth0Authentication"
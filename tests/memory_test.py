@@ -0,0 +1,63 @@
+from dataclasses import dataclass
+
+from devices.memory import MemoryAccounting, deep_sizeof
+
+
+@dataclass
+class Node:
+    name: str
+    children: list
+
+
+class FakeResponse:  # pylint: disable=too-few-public-methods
+
+    def __init__(self, content):
+        self.content = content
+
+
+def test_deep_sizeof_counts_shared_objects_once():
+    # Given
+    shared = "x" * 1000
+    node = Node("node", [shared, shared])
+
+    # When
+    size = deep_sizeof(node)
+
+    # Then
+    assert deep_sizeof(shared) < size < 2 * deep_sizeof(shared)
+    assert deep_sizeof([node, node]) < 2 * size
+
+
+def test_memory_accounting_sample():
+    # Given
+    samples = []
+    accounting = MemoryAccounting(on_sample=samples.append)
+    data = {"data": [{"id": str(index)} for index in range(100)]}
+
+    # When
+    result = accounting.load(FakeResponse(b"x" * 2000), lambda data: data["data"], data, "/v2/devices", "aCustomer")
+
+    # Then
+    [sample] = samples
+    assert result is data["data"]
+    assert (sample.endpoint, sample.customer_id, sample.body) == ("/v2/devices", "aCustomer", 2000)
+    assert sample.decoded > sample.retained > 0
+
+
+def test_memory_accounting_debug_mode_uses_tracemalloc():
+    # Given
+    samples = []
+    accounting = MemoryAccounting(debug=True, on_sample=samples.append)
+
+    try:
+        # When
+        result = accounting.load(
+            FakeResponse(b"{}"), lambda _: [bytearray(1000) for _ in range(100)], {}, "/v2/devices", "aCustomer"
+        )
+    finally:
+        accounting.close()
+
+    # Then
+    [sample] = samples
+    assert len(result) == 100
+    assert sample.retained >= 100 * 1000
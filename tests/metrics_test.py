@@ -0,0 +1,145 @@
+import pytest
+import responses
+from requests.exceptions import ConnectionError as RequestsConnectionError
+
+from devices.auth0 import Auth0Client
+from devices.metrics import Histogram, InMemorySink, LoggingSink, Metrics, RequestSample, RequestTimings, load_timed
+from devices.retry import RetryPolicy
+from devices.session import new_session
+from devices.settings import AUTH0_URL
+from devices.transport import RequestsBackend, Transport, Urllib3Backend
+from devices.v2.errors import APIDevicesV2Error
+from tests.mocks.response import http_200_callback
+
+
+def test_histogram_is_cumulative():
+    # Given
+    histogram = Histogram(buckets=(0.1, 1))
+
+    # When
+    for value in (0.05, 0.1, 0.5, 3):
+        histogram.observe(value)
+
+    # Then
+    assert histogram.counts == [2, 3, 4]
+    assert histogram.count == 4
+    assert histogram.sum == pytest.approx(3.65)
+
+
+def test_in_memory_sink_aggregates_per_endpoint_and_method():
+    # Given
+    sink = InMemorySink(buckets=(0.1, 1))
+
+    # When
+    sink.record(RequestSample("/v2/devices", "GET", 0.05, status_code=200, bytes_in=100))
+    sink.record(RequestSample("/v2/devices", "GET", 0.5, status_code=503, bytes_in=10))
+    sink.record(RequestSample("/v2/devices", "GET", 2, error="ReadTimeout"))
+    sink.record(RequestSample("/v2/mdm", "POST", 0.2, status_code=201, bytes_out=50))
+
+    # Then
+    series = sink.series()
+    assert series[("/v2/devices", "GET")] == dict(
+        requests=3,
+        latency_sum=2.55,
+        latency_buckets={
+            0.1: 1,
+            1: 2,
+            float("inf"): 3
+        },
+        statuses={
+            200: 1,
+            503: 1
+        },
+        errors={"ReadTimeout": 1},
+        bytes_in=110,
+        bytes_out=0,
+    )
+    assert series[("/v2/mdm", "POST")]["bytes_out"] == 50
+
+
+def test_logging_sink():
+    # Given
+    lines = []
+    metrics = Metrics(LoggingSink(log=lines.append))
+
+    # When
+    metrics.record(RequestSample("/v2/devices", "GET", 0.0123, status_code=200))
+
+    # Then
+    assert lines == ["GET /v2/devices 200 in 12.30 ms"]
+    assert metrics.series() == {}
+
+
+def test_in_memory_sink_phases():
+    # Given
+    metrics = Metrics(InMemorySink(buckets=(0.1, 1)))
+
+    # When
+    metrics.record_timings(RequestTimings("/v2/devices", "GET", request=0.3, ttfb=0.2, download=0.1, decode=0.05))
+    metrics.record_timings(RequestTimings("/v2/devices", "GET", request=0.4, decode=0.5, load=2))
+
+    # Then
+    phases = metrics.phases()[("/v2/devices", "GET")]
+    assert phases["ttfb"] == dict(count=1, sum=0.2, buckets={0.1: 0, 1: 1, float("inf"): 1})
+    assert phases["decode"]["count"] == 2
+    assert phases["load"]["buckets"] == {0.1: 1, 1: 1, float("inf"): 2}
+
+
+@pytest.mark.parametrize("backend", [RequestsBackend, Urllib3Backend])
+def test_load_timed(backend, http_server):
+    # Given
+    timings = []
+    response = backend(new_session("aToken")).request("POST", f"{http_server}/echo", json={"a": 1})
+
+    # When
+    result = load_timed(response, lambda data: data["body"], "/echo", "POST", 0, [timings.append])
+
+    # Then
+    assert result == '{"a": 1}'
+    [timing] = timings
+    assert (timing.endpoint, timing.method) == ("/echo", "POST")
+    assert timing.ttfb > 0 and timing.download >= 0
+    assert timing.decode >= 0 and timing.load >= 0
+    assert timing.total >= timing.ttfb + timing.download
+
+
+@pytest.mark.parametrize("backend", [RequestsBackend, Urllib3Backend])
+def test_transport_metrics(backend, http_server):
+    # Given
+    metrics = Metrics()
+    transport = Transport(backend(new_session("aToken")), metrics=metrics, retry_policy=RetryPolicy(max_retries=0))
+
+    # When
+    transport.request("POST", f"{http_server}/echo", json={"a": 1}, endpoint="/echo")
+    with pytest.raises(APIDevicesV2Error):
+        transport.request("GET", f"{http_server}/status/503", endpoint="/status", error=APIDevicesV2Error)
+    with pytest.raises(RequestsConnectionError):
+        transport.request("GET", "http://127.0.0.1:1/v2/devices", endpoint="/v2/devices")
+
+    # Then
+    series = metrics.series()
+    assert series[("/echo", "POST")]["statuses"] == {200: 1}
+    assert series[("/echo", "POST")]["bytes_out"] == len('{"a": 1}')
+    assert series[("/echo", "POST")]["bytes_in"] > 0
+    assert series[("/status", "GET")]["statuses"] == {503: 1}
+    assert series[("/v2/devices", "GET")]["errors"] == {"ConnectionError": 1}
+
+
+@responses.activate
+def test_auth0_token_request_metrics():
+    # Given
+    metrics = Metrics()
+    auth0_client = Auth0Client(token_store=None, metrics=metrics)
+    responses.add_callback(
+        responses.POST,
+        AUTH0_URL,
+        callback=http_200_callback(body=dict(access_token="some_token", expires_in=3600)),
+    )
+
+    # When
+    _ = auth0_client.token
+
+    # Then
+    [(endpoint, method)] = metrics.series().keys()
+    assert method == "POST"
+    assert metrics.series()[(endpoint, method)]["statuses"] == {200: 1}
@@ -58,4 +58,6 @@ http_202_callback = functools.partial(_http_callback, status_code=HTTPStatus.ACC
 http_204_callback = functools.partial(_http_callback, status_code=HTTPStatus.NO_CONTENT)
 http_400_callback = functools.partial(_http_callback, status_code=HTTPStatus.BAD_REQUEST)
 http_401_callback = functools.partial(_http_callback, status_code=HTTPStatus.UNAUTHORIZED)
+http_404_callback = functools.partial(_http_callback, status_code=HTTPStatus.NOT_FOUND)
 http_500_callback = functools.partial(_http_callback, status_code=HTTPStatus.INTERNAL_SERVER_ERROR)
+http_503_callback = functools.partial(_http_callback, status_code=HTTPStatus.SERVICE_UNAVAILABLE)
@@ -0,0 +1,93 @@
+import os
+import pstats
+
+import responses
+from requests import Session
+
+from devices.profiling import SlowRequestProfiler
+from devices.v2.query import Devices
+from tests.mocks.response import http_200_callback
+
+
+class FakeResponse:  # pylint: disable=too-few-public-methods
+
+    def __init__(self, content=b"{}"):
+        self.content = content
+
+
+def test_fast_requests_are_not_profiled():
+    # Given
+    profiles = []
+    profiler = SlowRequestProfiler(threshold=1, size_threshold=1000, on_profile=profiles.append, rand=lambda: 0.5)
+
+    # When
+    result = profiler.profile("/v2/devices", "GET", FakeResponse(), elapsed=0.1, load=lambda: "loaded")
+
+    # Then
+    assert result == "loaded"
+    assert profiles == []
+    assert profiler.stats()["profiled"] == 0
+
+
+def test_slow_large_and_sampled_requests_are_profiled():
+    # Given
+    profiles = []
+    profiler = SlowRequestProfiler(
+        threshold=1, size_threshold=10, sample_rate=0.1, on_profile=profiles.append, rand=lambda: 0.05
+    )
+
+    # When
+    profiler.profile("/v2/devices", "GET", FakeResponse(), elapsed=2, load=lambda: sorted(range(1000)))
+    profiler.profile("/v2/devices", "GET", FakeResponse(b"x" * 10), elapsed=0, load=lambda: None)
+    profiler.profile("/v2/devices", "GET", FakeResponse(), elapsed=0, load=lambda: None)
+
+    # Then
+    assert [profile.reason for profile in profiles] == ["slow", "large", "sampled"]
+    assert "sorted" in profiles[0].text()
+    assert profiles[1].body_bytes == 10
+    assert profiler.stats() == dict(profiled=3, reported=3, skipped_busy=0)
+
+
+def test_profiles_shorter_than_min_duration_are_dropped():
+    # Given
+    profiles = []
+    profiler = SlowRequestProfiler(sample_rate=1, min_duration=60, on_profile=profiles.append)
+
+    # When
+    profiler.profile("/v2/devices", "GET", FakeResponse(), elapsed=0, load=lambda: None)
+
+    # Then
+    assert profiles == []
+    assert profiler.stats()["profiled"] == 1
+
+
+def test_failing_callback_does_not_fail_the_query():
+    # Given
+    def on_profile(_):
+        raise RuntimeError("boom")
+
+    profiler = SlowRequestProfiler(sample_rate=1, on_profile=on_profile)
+
+    # When
+    result = profiler.profile("/v2/devices", "GET", FakeResponse(), elapsed=0, load=lambda: "loaded")
+
+    # Then
+    assert result == "loaded"
+
+
+@responses.activate
+def test_query_profiles_are_written_to_directory(tmp_path, customer_id):
+    # Given
+    url = "http://localhost"
+    body = {"after": None, "count": 0, "total": 0, "data": []}
+    profiler = SlowRequestProfiler(sample_rate=1, directory=str(tmp_path / "profiles"))
+    responses.add_callback(responses.GET, f"{url}/v2/devices", callback=http_200_callback(body=body))
+
+    # When
+    Devices(Session(), url, customer_id=customer_id, profiler=profiler).all()
+
+    # Then
+    [name] = os.listdir(tmp_path / "profiles")
+    assert name.endswith("-sampled-GET_v2_devices.prof")
+    stats = pstats.Stats(str(tmp_path / "profiles" / name))
+    assert any(function == "load" for _, _, function in stats.stats)
@@ -0,0 +1,141 @@
+import requests
+import responses
+
+from devices.auth0 import Auth0Client
+from devices.cache import NegativeCache
+from devices.coalescing import SingleFlight
+from devices.metrics import InMemorySink, Metrics, RequestSample, RequestTimings
+from devices.prometheus import CONTENT_TYPE, PrometheusExporter
+from devices.retry import RetryPolicy
+from devices.settings import AUTH0_URL
+from devices.v2.client import DevicesV2API
+from tests.mocks.response import http_200_callback
+
+
+def test_expose_request_metrics():
+    # Given
+    metrics = Metrics(InMemorySink(buckets=(0.1, 1)))
+    metrics.record(RequestSample("/v2/devices", "GET", 0.05, status_code=200, bytes_in=100))
+    metrics.record(RequestSample("/v2/devices", "GET", 2, error="ReadTimeout"))
+    metrics.record_timings(RequestTimings("/v2/devices", "GET", request=0.05, decode=0.02, load=0.5))
+    exporter = PrometheusExporter(metrics=metrics)
+
+    # When
+    text = exporter.expose()
+
+    # Then
+    lines = text.splitlines()
+    assert "# TYPE devices_client_request_duration_seconds histogram" in lines
+    assert 'devices_client_request_duration_seconds_bucket{endpoint="/v2/devices",method="GET",le="0.1"} 1' in lines
+    assert 'devices_client_request_duration_seconds_bucket{endpoint="/v2/devices",method="GET",le="+Inf"} 2' in lines
+    assert 'devices_client_request_duration_seconds_count{endpoint="/v2/devices",method="GET"} 2' in lines
+    assert 'devices_client_requests_total{endpoint="/v2/devices",method="GET",status="200"} 1' in lines
+    assert 'devices_client_request_errors_total{endpoint="/v2/devices",method="GET",error="ReadTimeout"} 1' in lines
+    assert 'devices_client_response_bytes_total{endpoint="/v2/devices",method="GET"} 100' in lines
+    assert (
+        'devices_client_phase_duration_seconds_bucket{endpoint="/v2/devices",method="GET",phase="load",le="1.0"} 1'
+        in lines
+    )
+    assert 'devices_client_phase_duration_seconds_sum{endpoint="/v2/devices",method="GET",phase="decode"} 0.02' in lines
+    assert text.endswith("\n")
+
+
+def test_expose_policies():
+    # Given
+    retry_policy = RetryPolicy()
+    negative_cache = NegativeCache()
+    negative_cache.get("missing")
+    single_flight = SingleFlight()
+    single_flight.do("key", lambda: 1)
+    exporter = PrometheusExporter(
+        retry_policy=retry_policy,
+        negative_cache=negative_cache,
+        single_flight=single_flight,
+        pools=[lambda: {
+            "http://host:80": dict(maxsize=4, in_use=1, idle=2, connections=3, requests=10)
+        }],
+        namespace="app",
+    )
+
+    # When
+    lines = exporter.expose().splitlines()
+
+    # Then
+    assert "app_retries_total 0" in lines
+    assert 'app_retries_skipped_total{reason="budget_exhausted"} 0' in lines
+    assert 'app_negative_cache_lookups_total{result="miss"} 1' in lines
+    assert "app_negative_cache_hit_ratio 0.0" in lines
+    assert 'app_coalesced_calls_total{result="executed"} 1' in lines
+    assert 'app_pool_connections{host="http://host:80",state="in_use"} 1' in lines
+    assert 'app_pool_utilization{host="http://host:80"} 0.25' in lines
+    assert 'app_pool_requests_total{host="http://host:80"} 10' in lines
+
+
+@responses.activate
+def test_exporter_from_client():
+    # Given
+    auth0_client = Auth0Client(token_store=None, audience="anAudience")
+    responses.add_callback(
+        responses.POST,
+        AUTH0_URL,
+        callback=http_200_callback(body=dict(access_token="some_token", expires_in=3600)),
+    )
+    _ = auth0_client.token
+    client = DevicesV2API.from_auth0("http://localhost", auth0_client, metrics=Metrics(), retry_policy=RetryPolicy())
+
+    # When
+    lines = PrometheusExporter.from_client(client).expose().splitlines()
+
+    # Then
+    assert 'devices_client_token_requests_total{audience="anAudience"} 1' in lines
+    assert 'devices_client_token_request_failures_total{audience="anAudience"} 0' in lines
+    assert "devices_client_retry_requests_total 0" in lines
+
+
+def test_label_values_are_escaped():
+    # Given
+    metrics = Metrics()
+    metrics.record(RequestSample('/v2/"odd"\\path\n', "GET", 0.01, status_code=200))
+
+    # When
+    text = PrometheusExporter(metrics=metrics).expose()
+
+    # Then
+    assert 'endpoint="/v2/\\"odd\\"\\\\path\\n"' in text
+
+
+def test_serve_metrics():
+    # Given
+    metrics = Metrics()
+    metrics.record(RequestSample("/v2/devices", "GET", 0.01, status_code=200))
+    server = PrometheusExporter(metrics=metrics).serve()
+
+    try:
+        # When
+        response = requests.get(f"http://127.0.0.1:{server.server_port}/metrics")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    # Then
+    assert response.headers["Content-Type"] == CONTENT_TYPE
+    assert 'devices_client_requests_total{endpoint="/v2/devices",method="GET",status="200"} 1' in response.text
+
+
+def test_register_in_registry():
+    # Given
+    registered = []
+
+    class Registry:
+
+        def register(self, collector):
+            registered.append(collector)
+
+    exporter = PrometheusExporter()
+
+    # When
+    registry = exporter.register(Registry())
+
+    # Then
+    assert registered == [exporter]
+    assert isinstance(registry, Registry)
@@ -0,0 +1,113 @@
+import asyncio
+import threading
+
+import pytest
+
+from devices.ratelimit import RateLimiter, TokenBucket
+
+
+def test_token_bucket_allows_bursts(clock):
+    # Given
+    bucket = TokenBucket(rate=10, burst=3, clock=clock)
+
+    # When
+    waits = [bucket.reserve() for _ in range(5)]
+
+    # Then
+    assert waits == pytest.approx([0, 0, 0, 0.1, 0.2])
+
+
+def test_token_bucket_refills(clock):
+    # Given
+    bucket = TokenBucket(rate=10, burst=2, clock=clock)
+    bucket.reserve()
+    bucket.reserve()
+
+    # When
+    clock.advance(0.1)
+
+    # Then
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(0.1)
+
+
+def test_token_bucket_does_not_exceed_burst(clock):
+    # Given
+    bucket = TokenBucket(rate=10, burst=2, clock=clock)
+
+    # When
+    clock.advance(100)
+
+    # Then
+    assert [bucket.reserve() for _ in range(3)] == pytest.approx([0, 0, 0.1])
+
+
+def test_token_bucket_invalid_params():
+    # When/Then
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0)
+
+
+def test_rate_limiter_waits(clock):
+    # Given
+    rate_limiter = RateLimiter(rate=2, burst=1, clock=clock, sleep=clock.sleep)
+
+    # When
+    for _ in range(3):
+        rate_limiter.acquire()
+
+    # Then
+    assert clock.now == pytest.approx(1001)
+    assert rate_limiter.stats() == {"acquired": 3, "throttled": 2, "waited_seconds": pytest.approx(1)}
+
+
+def test_rate_limiter_per_endpoint(clock):
+    # Given
+    rate_limiter = RateLimiter(
+        rate=100,
+        burst=100,
+        per_endpoint={"/v2/devices": (1, 1)},
+        clock=clock,
+        sleep=clock.sleep,
+    )
+
+    # When
+    rate_limiter.acquire("/v2/mdm")
+    rate_limiter.acquire("/v2/mdm")
+    rate_limiter.acquire("/v2/devices")
+    rate_limiter.acquire("/v2/devices")
+
+    # Then
+    assert clock.now == pytest.approx(1001)
+    assert rate_limiter.stats()["throttled"] == 1
+
+
+def test_rate_limiter_is_shared_across_threads():
+    # Given
+    rate_limiter = RateLimiter(rate=1000, burst=1, sleep=lambda _: None)
+
+    # When
+    threads = [threading.Thread(target=rate_limiter.acquire) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Then
+    stats = rate_limiter.stats()
+    assert stats["acquired"] == 20
+    assert stats["throttled"] >= 1
+
+
+def test_rate_limiter_async(clock):
+    # Given
+    rate_limiter = RateLimiter(rate=1000, burst=2, clock=clock)
+
+    async def acquire_all():
+        await asyncio.gather(*[rate_limiter.acquire_async() for _ in range(3)])
+
+    # When
+    asyncio.run(acquire_all())
+
+    # Then
+    assert rate_limiter.stats()["throttled"] == 1
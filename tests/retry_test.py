@@ -0,0 +1,217 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from http import HTTPStatus
+
+import pytest
+from requests.exceptions import ConnectionError as RequestsConnectionError
+
+from devices.deadline import Deadline
+from devices.retry import RetryBudget, RetryPolicy
+
+
+def test_retry_transient_status_until_success(sleeps):
+    # Given
+    policy = RetryPolicy(max_retries=3, sleep=sleeps.append)
+    send = Sender(Response(HTTPStatus.SERVICE_UNAVAILABLE), Response(HTTPStatus.BAD_GATEWAY), Response(HTTPStatus.OK))
+
+    # When
+    response = policy.call("GET", send)
+
+    # Then
+    assert response.status_code == HTTPStatus.OK
+    assert send.calls == 3
+    assert len(sleeps) == 2
+    assert policy.stats()["retries"] == 2
+
+
+def test_retry_connection_errors(sleeps):
+    # Given
+    policy = RetryPolicy(max_retries=3, sleep=sleeps.append)
+    send = Sender(RequestsConnectionError("reset"), Response(HTTPStatus.OK))
+
+    # When
+    response = policy.call("DELETE", send)
+
+    # Then
+    assert response.status_code == HTTPStatus.OK
+    assert send.calls == 2
+
+
+def test_retry_gives_up_after_max_retries(sleeps):
+    # Given
+    policy = RetryPolicy(max_retries=2, sleep=sleeps.append)
+    send = Sender(*[Response(HTTPStatus.GATEWAY_TIMEOUT)] * 5)
+
+    # When
+    response = policy.call("GET", send)
+
+    # Then
+    assert response.status_code == HTTPStatus.GATEWAY_TIMEOUT
+    assert send.calls == 3
+    assert policy.stats()["exhausted"] == 1
+
+
+def test_retry_raises_connection_error_after_max_retries(sleeps):
+    # Given
+    policy = RetryPolicy(max_retries=1, sleep=sleeps.append)
+    send = Sender(RequestsConnectionError("reset"), RequestsConnectionError("reset"))
+
+    # When/Then
+    with pytest.raises(RequestsConnectionError):
+        policy.call("GET", send)
+    assert send.calls == 2
+
+
+@pytest.mark.parametrize("method", ["POST", "PATCH"])
+def test_no_retry_for_non_idempotent_methods(sleeps, method):
+    # Given
+    policy = RetryPolicy(sleep=sleeps.append)
+    send = Sender(Response(HTTPStatus.SERVICE_UNAVAILABLE), Response(HTTPStatus.OK))
+
+    # When
+    response = policy.call(method, send)
+
+    # Then
+    assert response.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+    assert send.calls == 1
+
+
+def test_no_retry_for_other_statuses(sleeps):
+    # Given
+    policy = RetryPolicy(sleep=sleeps.append)
+    send = Sender(Response(HTTPStatus.INTERNAL_SERVER_ERROR))
+
+    # When
+    response = policy.call("GET", send)
+
+    # Then
+    assert response.status_code == HTTPStatus.INTERNAL_SERVER_ERROR
+    assert send.calls == 1
+
+
+def test_retry_after_seconds(sleeps):
+    # Given
+    policy = RetryPolicy(sleep=sleeps.append)
+    send = Sender(Response(HTTPStatus.TOO_MANY_REQUESTS, headers={"Retry-After": "7"}), Response(HTTPStatus.OK))
+
+    # When
+    policy.call("GET", send)
+
+    # Then
+    assert sleeps == [7]
+
+
+def test_retry_after_http_date():
+    # Given
+    policy = RetryPolicy(max_retry_after=60)
+    date = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+
+    # When
+    delay = policy.retry_after(Response(HTTPStatus.TOO_MANY_REQUESTS, headers={"Retry-After": date}))
+
+    # Then
+    assert 28 <= delay <= 30
+
+
+def test_retry_after_http_date_without_timezone():
+    # Given
+    policy = RetryPolicy(max_retry_after=60)
+    date = (datetime.now(timezone.utc) + timedelta(seconds=30)).strftime("%a, %d %b %Y %H:%M:%S -0000")
+
+    # When
+    delay = policy.retry_after(Response(HTTPStatus.TOO_MANY_REQUESTS, headers={"Retry-After": date}))
+
+    # Then
+    assert 28 <= delay <= 30
+
+
+@pytest.mark.parametrize("value, expected", [("120", 60), ("-5", 0), ("not a date", None)])
+def test_retry_after_bounds(value, expected):
+    # Given
+    policy = RetryPolicy(max_retry_after=60)
+
+    # When/Then
+    assert policy.retry_after(Response(HTTPStatus.TOO_MANY_REQUESTS, headers={"Retry-After": value})) == expected
+
+
+def test_backoff_full_jitter():
+    # Given
+    policy = RetryPolicy(backoff_base=1, backoff_max=5)
+
+    # When/Then
+    for attempt in range(10):
+        assert 0 <= policy.backoff(attempt) <= min(5, 2**attempt)
+
+
+def test_retry_budget_limits_retries(sleeps):
+    # Given
+    budget = RetryBudget(ratio=0, max_tokens=1)
+    policy = RetryPolicy(max_retries=5, budget=budget, sleep=sleeps.append)
+    send = Sender(*[Response(HTTPStatus.SERVICE_UNAVAILABLE)] * 5)
+
+    # When
+    response = policy.call("GET", send)
+
+    # Then
+    assert response.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+    assert send.calls == 2
+    assert policy.stats()["budget_exhausted"] == 1
+
+
+def test_retry_budget_deposits():
+    # Given
+    budget = RetryBudget(ratio=0.5, max_tokens=1)
+    assert budget.withdraw()
+    assert not budget.withdraw()
+
+    # When
+    budget.deposit()
+    budget.deposit()
+
+    # Then
+    assert budget.withdraw()
+
+
+def test_no_retry_past_deadline(sleeps, clock):
+    # Given
+    deadline = Deadline(5, clock=clock)
+    policy = RetryPolicy(max_retries=3, sleep=sleeps.append)
+    send = Sender(Response(HTTPStatus.SERVICE_UNAVAILABLE, headers={"Retry-After": "10"}), Response(HTTPStatus.OK))
+
+    # When
+    response = policy.call("GET", send, deadline=deadline)
+
+    # Then
+    assert response.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+    assert send.calls == 1
+    assert not sleeps
+    assert policy.stats()["deadline_exceeded"] == 1
+
+
+@pytest.fixture(name="sleeps")
+def get_sleeps():
+    return []
+
+
+class Response:
+
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def close(self):
+        pass
+
+
+class Sender:
+
+    def __init__(self, *outcomes):
+        self._outcomes = list(outcomes)
+        self.calls = 0
+
+    def __call__(self):
+        outcome = self._outcomes[self.calls]
+        self.calls += 1
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
@@ -0,0 +1,164 @@
+import pytest
+from requests.adapters import HTTPAdapter
+
+from devices.auth0 import Auth0Client
+from devices.session import SHARED_ADAPTERS, BorrowedAdapter, new_session, pool_stats, warm_up
+from devices.v1.client import DevicesV1API
+from devices.v2.client import DevicesV2API
+
+
+def test_new_session_pool_options(auth_token):
+    # Given / When
+    session = new_session(auth_token, pool_connections=4, pool_maxsize=32, pool_block=True)
+
+    # Then
+    adapter = session.get_adapter("https://some.host")
+    assert isinstance(adapter, HTTPAdapter)
+    assert session.get_adapter("http://some.host") is adapter
+    assert adapter.poolmanager.connection_pool_kw["maxsize"] == 32
+    assert adapter.poolmanager.connection_pool_kw["block"] is True
+    assert adapter.poolmanager.pools._maxsize == 4
+    assert session.auth.token == auth_token
+    assert session.headers["Connection"] == "keep-alive"
+
+
+def test_new_session_without_keep_alive(auth_token):
+    # Given / When
+    session = new_session(auth_token, keep_alive=False)
+
+    # Then
+    assert session.headers["Connection"] == "close"
+
+
+def test_pool_stats(auth_token, http_server):
+    # Given
+    session = new_session(auth_token, pool_maxsize=5)
+
+    # When
+    for _ in range(3):
+        session.get(f"{http_server}/v2/devices").raise_for_status()
+
+    # Then
+    assert pool_stats(session) == {
+        http_server: {
+            "maxsize": 5,
+            "in_use": 0,
+            "idle": 1,
+            "connections": 1,
+            "requests": 3,
+        }
+    }
+
+
+def test_pool_stats_without_requests(auth_token):
+    # Given / When
+    session = new_session(auth_token)
+
+    # Then
+    assert pool_stats(session) == {}
+
+
+def test_shared_adapters_reuse_connections(auth_token, http_server, shared_adapters):
+    # Given / When
+    for token in (auth_token, "anotherToken"):
+        session = new_session(token, shared_url=f"{http_server}/v2", pool_maxsize=5)
+        response = session.get(f"{http_server}/v2/devices")
+        session.close()
+
+        # Then
+        assert response.request.headers["Authorization"] == f"Bearer {token}"
+
+    session = new_session(auth_token, shared_url=http_server, pool_maxsize=5)
+    assert isinstance(session.get_adapter(http_server), BorrowedAdapter)
+    assert len(shared_adapters) == 1
+    assert pool_stats(session)[http_server]["connections"] == 1
+    assert pool_stats(session)[http_server]["requests"] == 2
+
+
+def test_clients_share_transport(url, auth_token, shared_adapters):
+    # Given / When
+    with DevicesV2API(url, auth_token, shared_transport=True) as first:
+        pass
+    with DevicesV2API(url, "anotherToken", shared_transport=True) as second:
+        pass
+    with DevicesV1API(url, auth_token, shared_transport=True) as v1_client:
+        pass
+
+    # Then
+    adapter = first.session.get_adapter(url).adapter
+    assert second.session.get_adapter(url).adapter is adapter
+    assert v1_client.pool_stats() == second.pool_stats()
+    assert first.session.auth.token != second.session.auth.token
+    assert len(shared_adapters) == 1
+
+
+def test_shared_adapters_keyed_by_options(auth_token, shared_adapters):
+    # Given / When
+    new_session(auth_token, shared_url="https://some.host/v2")
+    new_session(auth_token, shared_url="https://some.host:443/v1")
+    new_session(auth_token, shared_url="https://some.host", pool_maxsize=64)
+    new_session(auth_token, shared_url="https://other.host")
+
+    # Then
+    assert len(shared_adapters) == 3
+
+
+def test_warm_up(auth_token, http_server):
+    # Given
+    session = new_session(auth_token, pool_maxsize=5)
+
+    # When
+    opened = warm_up(session, http_server, connections=3)
+    session.get(f"{http_server}/v2/devices").raise_for_status()
+
+    # Then
+    assert opened == 3
+    assert pool_stats(session)[http_server]["connections"] == 3
+    assert pool_stats(session)[http_server]["idle"] == 3
+
+
+def test_warm_up_in_background(auth_token, http_server):
+    # Given
+    session = new_session(auth_token)
+
+    # When
+    warm_up(session, http_server, connections=2, background=True).join()
+
+    # Then
+    assert pool_stats(session)[http_server]["connections"] == 2
+
+
+def test_warm_up_failure(auth_token):
+    # Given
+    session = new_session(auth_token)
+
+    # When / Then
+    assert warm_up(session, "http://127.0.0.1:1") == 0
+
+
+def test_client_warm_up(http_server):
+    # Given
+    auth0_client = Auth0Client(url=f"{http_server}/oauth/token", token_store=None)
+
+    # When
+    client = DevicesV2API(http_server, auth0_client, warm_up_connections=2)
+
+    # Then the API and the Auth0 token endpoint are warm
+    assert client.pool_stats()[http_server]["connections"] == 2
+    assert pool_stats(auth0_client._session)[http_server]["connections"] == 1  # pylint: disable=protected-access
+
+
+@pytest.fixture(name="shared_adapters")
+def get_shared_adapters():
+    yield SHARED_ADAPTERS
+    SHARED_ADAPTERS.close()
+
+
+@pytest.fixture(name="url")
+def get_url():
+    return "https://devices.test"
+
+
+@pytest.fixture(name="auth_token")
+def get_auth_token():
+    return "aRandomBearerTokenForAuth0Authentication"
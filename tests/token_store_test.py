@@ -0,0 +1,119 @@
+import os
+import threading
+import time
+
+import responses
+
+from devices.auth0 import Auth0Client
+from devices.settings import AUTH0_URL
+from devices.token_store import FileTokenStore, StoredToken, default_path
+from tests.mocks.response import http_200_callback
+
+
+def test_file_token_store_save_and_load(token_store_path):
+    # Given
+    store = FileTokenStore(token_store_path)
+    token = StoredToken(access_token="some_token", issued_at=time.time(), expires_in=3600)
+
+    # When
+    store.save("key", token)
+
+    # Then
+    assert FileTokenStore(token_store_path).load("key") == token
+    assert store.load("another_key") is None
+
+
+def test_file_token_store_missing_or_corrupt_file(token_store_path):
+    # Given
+    store = FileTokenStore(token_store_path)
+
+    # When/Then
+    assert store.load("key") is None
+
+    with open(token_store_path, "w") as f:
+        f.write("not json")
+    assert store.load("key") is None
+
+
+def test_file_token_store_drops_expired_tokens(token_store_path):
+    # Given
+    store = FileTokenStore(token_store_path)
+    store.save("expired", StoredToken(access_token="old", issued_at=time.time() - 7200, expires_in=3600))
+
+    # When
+    store.save("key", StoredToken(access_token="new", issued_at=time.time(), expires_in=3600))
+
+    # Then
+    assert store.load("expired") is None
+    assert store.load("key").access_token == "new"
+
+
+def test_file_token_store_lock_is_exclusive(token_store_path):
+    # Given
+    first_store = FileTokenStore(token_store_path)
+    second_store = FileTokenStore(token_store_path)
+    events = []
+
+    def take_second_lock():
+        with second_store.lock("key"):
+            events.append("second")
+
+    # When
+    with first_store.lock("key"):
+        thread = threading.Thread(target=take_second_lock)
+        thread.start()
+        thread.join(timeout=0.2)
+        events.append("first")
+    thread.join(timeout=5)
+
+    # Then
+    assert events == ["first", "second"]
+
+
+def test_default_path_is_private_to_the_user():
+    # When
+    path = default_path()
+
+    # Then
+    assert str(os.getuid()) in os.path.basename(os.path.dirname(path))
+
+
+def test_file_token_store_ignores_files_accessible_to_others(token_store_path):
+    # Given
+    store = FileTokenStore(token_store_path)
+    store.save("key", StoredToken(access_token="some_token", issued_at=time.time(), expires_in=3600))
+
+    # When
+    os.chmod(token_store_path, 0o644)
+
+    # Then
+    assert store.load("key") is None
+
+
+@responses.activate
+def test_unusable_token_store_falls_back_to_auth0(token_store_path):
+    # Given a lock file that cannot be opened
+    os.mkdir(f"{token_store_path}.lock")
+    auth0_client = Auth0Client(token_store=FileTokenStore(token_store_path))
+    responses.add_callback(
+        responses.POST,
+        AUTH0_URL,
+        callback=http_200_callback(body=dict(access_token="some_token", expires_in=3600)),
+    )
+
+    # When
+    token = auth0_client.token
+
+    # Then
+    assert token == "some_token"
+    assert len(responses.calls) == 1
+
+
+def test_stored_token_validity():
+    # Given
+    token = StoredToken(access_token="some_token", issued_at=1000, expires_in=60)
+
+    # Then
+    assert token.expires_at == 1060
+    assert token.is_valid(now=1059)
+    assert not token.is_valid(now=1060)
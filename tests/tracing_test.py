@@ -0,0 +1,87 @@
+import pytest
+import responses
+
+from devices.auth0 import Auth0Client
+from devices.settings import AUTH0_URL
+from devices.tracing import NOOP_SPAN, NOOP_TRACER, OpenTelemetryTracer, RecordingTracer, trace
+from tests.mocks.response import http_200_callback
+
+
+def test_noop_tracer():
+    # Given
+    headers = {"Accept": "application/json"}
+
+    # When
+    with NOOP_TRACER.span("operation") as span:
+        injected = NOOP_TRACER.inject(headers)
+
+    # Then
+    assert span is NOOP_SPAN
+    assert injected is headers
+
+
+def test_recording_tracer_parent_and_child_spans():
+    # Given
+    tracer = RecordingTracer()
+
+    # When
+    with tracer.span("parent", {"a": 1}) as parent:
+        with tracer.span("child") as child:
+            headers = tracer.inject({"Accept": "application/json"})
+    with pytest.raises(ValueError):
+        with tracer.span("failing"):
+            raise ValueError("boom")
+
+    # Then
+    assert [span.name for span in tracer.spans] == ["child", "parent", "failing"]
+    assert child.parent is parent and parent.parent is None
+    assert child.trace_id == parent.trace_id
+    assert parent.attributes == {"a": 1}
+    assert headers == {"Accept": "application/json", "traceparent": f"00-{child.trace_id}-{child.span_id}-01"}
+    assert isinstance(tracer.spans[2].exception, ValueError)
+    assert tracer.current_span is None
+
+
+def test_recording_tracer_explicit_parent():
+    # Given
+    tracer = RecordingTracer()
+    parent = tracer.start_span("parent")
+
+    # When
+    with tracer.span("child", parent=parent) as child:
+        pass
+    parent.end()
+    parent.end()
+
+    # Then
+    assert child.parent is parent
+    assert [span.name for span in tracer.spans] == ["child", "parent"]
+
+
+@pytest.mark.skipif(trace is not None, reason="opentelemetry is installed")
+def test_opentelemetry_tracer_needs_opentelemetry():
+    # When/Then
+    with pytest.raises(ImportError, match="opentelemetry"):
+        OpenTelemetryTracer()
+
+
+@responses.activate
+def test_auth0_token_request_span():
+    # Given
+    tracer = RecordingTracer()
+    auth0_client = Auth0Client(token_store=None, tracer=tracer)
+    responses.add_callback(
+        responses.POST,
+        AUTH0_URL,
+        callback=http_200_callback(body=dict(access_token="some_token", expires_in=3600)),
+    )
+
+    # When
+    with tracer.span("caller") as caller:
+        _ = auth0_client.token
+
+    # Then
+    [token_span, _] = tracer.spans
+    assert token_span.name == "auth0.token"
+    assert token_span.parent is caller
+    assert responses.calls[0].request.headers["traceparent"] == token_span.traceparent
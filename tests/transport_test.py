@@ -0,0 +1,174 @@
+import asyncio
+import json
+from http import HTTPStatus
+
+import pytest
+import responses
+from requests import HTTPError
+from requests.exceptions import ChunkedEncodingError
+from requests.exceptions import ConnectionError as RequestsConnectionError
+
+from devices.circuit import CircuitBreaker, CircuitState
+from devices.deadline import Deadline
+from devices.errors import DeadlineExceededError
+from devices.retry import RetryPolicy
+from devices.session import new_session, pool_stats
+from devices.transport import RequestsBackend, Transport, Urllib3Backend
+from devices.v1.client import DevicesV1API
+from devices.v1.errors import APIDevicesV1Error
+from devices.v2.errors import APIDevicesV2Error
+from tests.mocks.response import http_200_callback, http_400_callback, http_503_callback
+
+_URL = "https://devices.test"
+
+
+@pytest.mark.parametrize("backend", [RequestsBackend, Urllib3Backend])
+def test_transport_request(backend, auth_token, http_server):
+    # Given
+    transport = Transport(backend(new_session(auth_token)))
+
+    # When
+    response = transport.request(
+        "POST",
+        f"{http_server}/echo",
+        params={
+            "customerId": "a b",
+            "limit": 10
+        },
+        json={"employee_ids": ["1"]},
+        headers={"Accept-Encoding": "gzip"},
+    )
+
+    # Then
+    echo = response.json()
+    assert echo["method"] == "POST"
+    assert echo["path"] == "/echo?customerId=a+b&limit=10"
+    assert echo["headers"]["Authorization"] == f"Bearer {auth_token}"
+    assert echo["headers"]["Accept-Encoding"] == "gzip"
+    assert echo["headers"]["Content-Type"] == "application/json"
+    assert json.loads(echo["body"]) == {"employee_ids": ["1"]}
+    assert response.request.headers["Authorization"] == f"Bearer {auth_token}"
+
+
+@pytest.mark.parametrize("backend", [RequestsBackend, Urllib3Backend])
+def test_transport_errors(backend, auth_token, http_server):
+    # Given
+    transport = Transport(backend(new_session(auth_token)))
+
+    # When/Then
+    with pytest.raises(APIDevicesV2Error) as err_info:
+        transport.request("GET", f"{http_server}/status/404", error=APIDevicesV2Error)
+    assert err_info.value.status_code == HTTPStatus.NOT_FOUND
+    assert err_info.value.code == "error"
+
+    with pytest.raises(RequestsConnectionError):
+        transport.request("GET", "http://127.0.0.1:1/v2/devices")
+
+
+def test_urllib3_backend_after_session_close(auth_token, http_server):
+    # Given
+    session = new_session(auth_token)
+    transport = Transport(Urllib3Backend(session))
+    transport.request("GET", f"{http_server}/v2/devices")
+
+    # When
+    session.close()
+
+    # Then
+    assert transport.request("GET", f"{http_server}/v2/devices").json() == {"ok": True}
+
+
+@pytest.mark.parametrize("backend", [RequestsBackend, Urllib3Backend])
+def test_transport_reuses_pooled_connections(backend, auth_token, http_server):
+    # Given
+    session = new_session(auth_token)
+    transport = Transport(backend(session))
+
+    # When
+    for _ in range(3):
+        transport.request("GET", f"{http_server}/v2/devices")
+
+    # Then
+    assert pool_stats(session)[http_server]["connections"] == 1
+    assert pool_stats(session)[http_server]["requests"] == 3
+
+
+@responses.activate
+def test_transport_wraps_errors(auth_token):
+    # Given
+    transport = Transport(RequestsBackend(new_session(auth_token)))
+    responses.add_callback(responses.GET, f"{_URL}/v2/devices", callback=http_400_callback(body={"error": "bad"}))
+
+    # When/Then
+    with pytest.raises(APIDevicesV1Error) as err_info:
+        transport.request("GET", f"{_URL}/v2/devices", error=APIDevicesV1Error)
+    assert err_info.value.status_code == HTTPStatus.BAD_REQUEST
+
+    with pytest.raises(HTTPError):
+        transport.request("GET", f"{_URL}/v2/devices")
+
+
+@responses.activate
+def test_transport_request_async(auth_token):
+    # Given
+    transport = Transport(RequestsBackend(new_session(auth_token)))
+    responses.add_callback(responses.GET, f"{_URL}/v2/devices", callback=http_200_callback(body={"ok": True}))
+
+    # When
+    response = asyncio.run(transport.request_async("GET", f"{_URL}/v2/devices"))
+
+    # Then
+    assert response.json() == {"ok": True}
+
+
+@responses.activate
+def test_v1_client_policies(auth_token, customer_id, customer_device_status):
+    # Given
+    retry_policy = RetryPolicy(sleep=lambda _: None)
+    client = DevicesV1API(_URL, auth_token, retry_policy=retry_policy)
+    expected_url = f"{_URL}/customers/{customer_id}/devices/status"
+    responses.add_callback(responses.GET, expected_url, callback=http_503_callback())
+    responses.add_callback(responses.GET, expected_url, callback=http_200_callback(body=customer_device_status))
+
+    # When
+    with client:
+        client.get_devices(customer_id).all()
+
+    # Then
+    assert isinstance(client.transport.backend, RequestsBackend)
+    assert retry_policy.stats()["retries"] == 1
+
+
+@pytest.fixture(name="auth_token")
+def get_auth_token():
+    return "aRandomBearerTokenForAuth0Authentication"
+
+
+@pytest.fixture(name="customer_device_status")
+def get_customer_device_status():
+    return {"after": None, "count": 0, "total": 0, "devices": []}
+
+
+@responses.activate
+def test_circuit_probe_is_not_lost_on_unexpected_errors(auth_token, clock):
+    # Given an open circuit past its recovery timeout
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=10, clock=clock)
+    transport = Transport(RequestsBackend(new_session(auth_token)), circuit_breaker=breaker)
+    responses.add_callback(responses.GET, f"{_URL}/v2/devices", callback=http_503_callback())
+    with pytest.raises(HTTPError):
+        transport.request("GET", f"{_URL}/v2/devices", endpoint="/v2/devices")
+    clock.advance(10)
+
+    # When the probe cannot be sent or fails in an unexpected way
+    with pytest.raises(DeadlineExceededError):
+        transport.request("GET", f"{_URL}/v2/devices", endpoint="/v2/devices", deadline=Deadline(0, clock=clock))
+    responses.replace(responses.GET, f"{_URL}/v2/devices", body=ChunkedEncodingError("truncated"))
+    with pytest.raises(ChunkedEncodingError):
+        transport.request("GET", f"{_URL}/v2/devices", endpoint="/v2/devices")
+
+    # Then the failed probe reopened the circuit, which half opens again later
+    assert breaker.state("/v2/devices") == CircuitState.OPEN
+    clock.advance(10)
+    responses.replace(responses.GET, f"{_URL}/v2/devices", json={})
+    transport.request("GET", f"{_URL}/v2/devices", endpoint="/v2/devices")
+    assert breaker.state("/v2/devices") == CircuitState.CLOSED
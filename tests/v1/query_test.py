@@ -2,10 +2,13 @@ from http import HTTPStatus
 
 import pytest
 import responses
+from devices.compression import ACCEPT_ENCODING, CompressionStats
+from devices.errors import RequestTimeoutError
 from devices.v1.errors import APIDevicesV1Error
 from devices.v1.query import CustomerDevices, FilterByOperator, Order, Query
 from devices.v1.schemas import CustomerDeviceStatus
 from requests import Session
+from requests.exceptions import ConnectTimeout
 from tests.mocks.response import http_200_callback, http_400_callback
 
 _APP_JSON = {"Accept": "*/*"}
@@ -55,6 +58,38 @@ def test_execute_query_error(url, customer_id, customer_device_error, error_mess
     assert err.detail["message"] == error_message
 
 
+@responses.activate
+def test_execute_query_compression_stats(url, customer_id, customer_device_status):
+    # Given
+    session = Session()
+    compression_stats = CompressionStats()
+    customer_devices_query = CustomerDevices(session, url, customer_id=customer_id, compression_stats=compression_stats)
+    responses.add(responses.GET, f"{url}/customers/{customer_id}/devices/status", json=customer_device_status)
+
+    # When
+    customer_devices_query.all()
+
+    # Then
+    assert responses.calls[0].request.headers["Accept-Encoding"] == ACCEPT_ENCODING
+    assert compression_stats.stats()["/customers/%s/devices/status"]["responses"] == 1
+
+
+@responses.activate
+def test_execute_query_timeout(url, customer_id):
+    # Given
+    session = Session()
+    customer_devices_query = CustomerDevices(session, url, customer_id=customer_id)
+    responses.add(
+        responses.GET,
+        f"{url}/customers/{customer_id}/devices/status",
+        body=ConnectTimeout("connect timed out"),
+    )
+
+    # When/Then
+    with pytest.raises(RequestTimeoutError):
+        customer_devices_query.all()
+
+
 def test_create_customer_devices_success(customer_id, url):
     # Given
     session = Session()
@@ -1,6 +1,10 @@
+from datetime import datetime
+
 import pytest
 from requests import Session
 
+from devices.auth0 import Auth0Client
+from devices.coalescing import SingleFlight
 from devices.errors import InvalidParamsError, InvalidTokenError
 from devices.v2.client import DevicesV2API
 from devices.v2.query import (
@@ -21,6 +25,29 @@ def test_client_session_creation_success(url, auth_token):
         assert isinstance(devices.session, Session)
 
 
+def test_client_from_auth0(url, auth_token):
+    # Given
+    auth0_client = Auth0Client(token_store=None)
+    auth0_client._set_token(auth_token, datetime.now(), 3600)
+
+    # When
+    with DevicesV2API.from_auth0(url, auth0_client) as devices:
+        # Then
+        assert devices.session.auth.token == auth_token
+        assert devices.url == url
+
+
+def test_client_pool_options(url, auth_token):
+    # Given / When
+    with DevicesV2API(url, auth_token, pool_maxsize=50, pool_block=True, keep_alive=False) as devices:
+        # Then
+        adapter = devices.session.get_adapter(url)
+        assert adapter.poolmanager.connection_pool_kw["maxsize"] == 50
+        assert adapter.poolmanager.connection_pool_kw["block"] is True
+        assert devices.session.headers["Connection"] == "close"
+        assert devices.pool_stats() == {}
+
+
 def test_client_session_invalid_token(url):
     with pytest.raises(InvalidTokenError):
         with DevicesV2API(url, auth_token=None) as _:
@@ -42,6 +69,21 @@ def test_devices(url, auth_token):
     assert customer_devices.query_parameters["customerId"] == customer_id
 
 
+def test_devices_single_flight(url, auth_token, customer_id, device_id):
+    # Given
+    single_flight = SingleFlight()
+
+    with DevicesV2API(url, auth_token, single_flight=single_flight) as devices:
+        # When
+        customer_devices = devices.devices(customer_id=customer_id)
+        assignment = devices.device(customer_id=customer_id, device_id=device_id).assignment()
+
+    # Then
+    assert devices.single_flight is single_flight
+    assert customer_devices.single_flight is single_flight
+    assert assignment.single_flight is single_flight
+
+
 def test_devices_missing_customer_id(url, auth_token):
     # Given
     customer_id = None
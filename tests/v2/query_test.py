@@ -1,9 +1,26 @@
+import gzip
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from http import HTTPStatus
 
 import pytest
 import responses
-from devices.errors import InvalidParamsError
+from devices.auth import Auth0Bearer
+from devices.cache import NegativeCache
+from devices.circuit import CircuitBreaker, CircuitState
+from devices.coalescing import SingleFlight
+from devices.compression import ACCEPT_ENCODING, CompressionStats
+from devices.deadline import Deadline
+from devices.errors import CircuitOpenError, DeadlineExceededError, InvalidParamsError, RequestTimeoutError
+from devices.hedging import HedgingPolicy
+from devices.memory import MemoryAccounting
+from devices.metrics import Metrics
+from devices.prometheus import PrometheusExporter
+from devices.ratelimit import RateLimiter
+from devices.retry import RetryPolicy
+from devices.tracing import RecordingTracer
 from devices.v2.errors import APIDevicesV2Error
 from devices.v2.query import (
     MDM,
@@ -11,6 +28,7 @@ from devices.v2.query import (
     Device,
     DeviceAssignment,
     Devices,
+    DevicesV2Endpoint,
     DownloadLink,
     FilterByOperator,
     Order,
@@ -18,11 +36,15 @@ from devices.v2.query import (
 )
 from devices.v2.schemas import DevicesResponse
 from requests import Session
+from requests.exceptions import ReadTimeout
 from tests.mocks.response import (
     http_200_callback,
     http_202_callback,
     http_204_callback,
     http_400_callback,
+    http_401_callback,
+    http_404_callback,
+    http_503_callback,
 )
 
 _APP_JSON = {"Accept": "*/*"}
@@ -77,6 +99,383 @@ def test_execute_query_error(url, customer_id):
     assert str(err) == f"({code}) {detail}"
 
 
+@responses.activate
+def test_execute_query_coalesces_concurrent_gets(url, customer_id, devices):
+    # Given
+    session = Session()
+    single_flight = SingleFlight()
+    release = threading.Event()
+    callback = http_200_callback(body=devices)
+
+    def slow_callback(request):
+        release.wait(timeout=5)
+        return callback(request)
+
+    expected_url = f"{url}/v2/devices"
+    responses.add_callback(responses.GET, expected_url, callback=slow_callback)
+
+    # When
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [
+            executor.submit(Devices(session, url, customer_id=customer_id, single_flight=single_flight).all)
+            for _ in range(4)
+        ]
+        while single_flight.coalesced < 3:
+            release.wait(0.01)
+        release.set()
+        results = [future.result() for future in futures]
+
+    # Then
+    assert len(responses.calls) == 1
+    assert all(result is results[0] for result in results)
+    assert single_flight.executed == 1
+    assert single_flight.coalesced == 3
+
+
+@responses.activate
+def test_execute_query_does_not_coalesce_gets_of_other_sessions(url, customer_id, devices):
+    # Given
+    single_flight = SingleFlight()
+    release = threading.Event()
+    callback = http_200_callback(body=devices)
+
+    def slow_callback(request):
+        release.wait(timeout=5)
+        return callback(request)
+
+    responses.add_callback(responses.GET, f"{url}/v2/devices", callback=slow_callback)
+
+    # When two tenants query the same resource at the same time
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [
+            executor.submit(Devices(Session(), url, customer_id=customer_id, single_flight=single_flight).all)
+            for _ in range(2)
+        ]
+        while single_flight.executed < 2:
+            release.wait(0.01)
+        release.set()
+        results = [future.result() for future in futures]
+
+    # Then
+    assert len(responses.calls) == 2
+    assert results[0] is not results[1]
+    assert single_flight.coalesced == 0
+
+
+@responses.activate
+def test_execute_query_replays_request_after_unauthorized(url, customer_id, devices):
+    # Given
+    token_provider = TokenProvider(tokens=["expired_token", "new_token"])
+    session = Session()
+    session.auth = Auth0Bearer(token_provider)
+    devices_query = Devices(session, url, customer_id=customer_id)
+
+    expected_url = f"{url}/v2/devices"
+    responses.add_callback(
+        responses.GET,
+        expected_url,
+        callback=http_401_callback(request_headers={"Authorization": "Bearer expired_token"}),
+    )
+    responses.add_callback(
+        responses.GET,
+        expected_url,
+        callback=http_200_callback(body=devices, request_headers={"Authorization": "Bearer new_token"}),
+    )
+
+    # When
+    response = devices_query.all()
+
+    # Then
+    assert response.dumps() == DevicesResponse.load(devices).dumps()
+    assert token_provider.invalidated == ["expired_token"]
+    assert len(responses.calls) == 2
+
+
+@responses.activate
+def test_execute_query_unauthorized_with_static_token(url, customer_id):
+    # Given
+    session = Session()
+    session.auth = Auth0Bearer("static_token")
+    devices_query = Devices(session, url, customer_id=customer_id)
+
+    error_response = dict(code="unauthorized", detail="invalid token", source=None)
+    responses.add_callback(responses.GET, f"{url}/v2/devices", callback=http_401_callback(body=error_response))
+
+    # When/Then
+    with pytest.raises(APIDevicesV2Error) as err_info:
+        _ = devices_query.all()
+
+    assert err_info.value.status_code == HTTPStatus.UNAUTHORIZED
+    assert len(responses.calls) == 1
+
+
+@responses.activate
+def test_execute_query_retries_transient_errors(url, customer_id, devices):
+    # Given
+    session = Session()
+    retry_policy = RetryPolicy(sleep=lambda _: None)
+    devices_query = Devices(session, url, customer_id=customer_id, retry_policy=retry_policy)
+
+    expected_url = f"{url}/v2/devices"
+    responses.add_callback(responses.GET, expected_url, callback=http_503_callback(headers={"Retry-After": "0"}))
+    responses.add_callback(responses.GET, expected_url, callback=http_200_callback(body=devices))
+
+    # When
+    response = devices_query.all()
+
+    # Then
+    assert response.dumps() == DevicesResponse.load(devices).dumps()
+    assert len(responses.calls) == 2
+    assert retry_policy.stats()["retries"] == 1
+
+
+@responses.activate
+def test_execute_query_does_not_retry_posts(url, customer_id, employee_ids):
+    # Given
+    session = Session()
+    retry_policy = RetryPolicy(sleep=lambda _: None)
+    assignments_query = Assignment(
+        session,
+        url,
+        customer_id=customer_id,
+        employee_ids=employee_ids,
+        retry_policy=retry_policy,
+    )
+    responses.add_callback(responses.POST, f"{url}/v2/assignments/request", callback=http_503_callback())
+
+    # When/Then
+    with pytest.raises(APIDevicesV2Error) as err_info:
+        assignments_query.request()
+
+    assert err_info.value.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+    assert len(responses.calls) == 1
+
+
+@responses.activate
+def test_execute_query_rate_limited(url, customer_id, device_id, devices, clock):
+    # Given
+    session = Session()
+    rate_limiter = RateLimiter(
+        rate=100,
+        burst=100,
+        per_endpoint={DevicesV2Endpoint.DEVICES: (1, 1)},
+        clock=clock,
+        sleep=clock.sleep,
+    )
+    responses.add_callback(responses.GET, f"{url}/v2/devices", callback=http_200_callback(body=devices))
+    responses.add_callback(responses.DELETE, f"{url}/v2/devices/{device_id}/assignment", callback=http_204_callback())
+
+    # When
+    for _ in range(2):
+        Devices(session, url, customer_id=customer_id, rate_limiter=rate_limiter).all()
+        DeviceAssignment(session, url, host_identifier=device_id, rate_limiter=rate_limiter).delete()
+
+    # Then
+    assert rate_limiter.stats()["acquired"] == 4
+    assert rate_limiter.stats()["throttled"] == 1
+    assert clock.now == pytest.approx(1001)
+
+
+@responses.activate
+def test_execute_query_circuit_breaker(url, customer_id, device_id, clock):
+    # Given
+    session = Session()
+    circuit_breaker = CircuitBreaker(failure_threshold=2, clock=clock)
+    responses.add_callback(responses.GET, f"{url}/v2/devices", callback=http_503_callback())
+    responses.add_callback(responses.DELETE, f"{url}/v2/devices/{device_id}/assignment", callback=http_204_callback())
+
+    # When
+    for _ in range(2):
+        with pytest.raises(APIDevicesV2Error):
+            Devices(session, url, customer_id=customer_id, circuit_breaker=circuit_breaker).all()
+
+    # Then requests to the failing endpoint fail fast, other endpoints are not affected
+    with pytest.raises(CircuitOpenError):
+        Devices(session, url, customer_id=customer_id, circuit_breaker=circuit_breaker).all()
+    DeviceAssignment(session, url, host_identifier=device_id, circuit_breaker=circuit_breaker).delete()
+
+    assert len(responses.calls) == 3
+    assert circuit_breaker.state(DevicesV2Endpoint.DEVICES) == CircuitState.OPEN
+    assert circuit_breaker.state(DevicesV2Endpoint.DEVICE_ASSIGNMENT) == CircuitState.CLOSED
+
+
+@responses.activate
+def test_execute_query_compression(url, customer_id, devices):
+    # Given
+    session = Session()
+    compression_stats = CompressionStats()
+    devices_query = Devices(session, url, customer_id=customer_id, compression_stats=compression_stats)
+    body = json.dumps(devices).encode()
+    responses.add(
+        responses.GET,
+        f"{url}/v2/devices",
+        body=gzip.compress(body),
+        headers={"Content-Encoding": "gzip"},
+        content_type="application/json",
+    )
+
+    # When
+    response = devices_query.all()
+
+    # Then
+    assert response.dumps() == DevicesResponse.load(devices).dumps()
+    assert responses.calls[0].request.headers["Accept-Encoding"] == ACCEPT_ENCODING
+    stats = compression_stats.stats()[DevicesV2Endpoint.DEVICES.value]
+    assert stats["compressed_bytes"] == len(gzip.compress(body))
+    assert stats["uncompressed_bytes"] == len(body)
+
+
+@responses.activate
+def test_execute_query_phase_timings(url, customer_id, devices):
+    # Given
+    timings = []
+    devices_query = Devices(Session(), url, customer_id=customer_id, on_timings=timings.append)
+    responses.add_callback(responses.GET, f"{url}/v2/devices", callback=http_200_callback(body=devices))
+
+    # When
+    response = devices_query.all()
+
+    # Then
+    assert response.dumps() == DevicesResponse.load(devices).dumps()
+    [timing] = timings
+    assert (timing.endpoint, timing.method) == (DevicesV2Endpoint.DEVICES.value, "GET")
+    assert set(timing.phases()) == {"ttfb", "download", "decode", "load"}
+    assert timing.load > 0
+
+
+@responses.activate
+def test_execute_query_hedging_only_gets(url, customer_id, employee_ids, devices):
+    # Given
+    session = Session()
+    hedging_policy = HedgingPolicy(initial_delay=1)
+    responses.add_callback(responses.GET, f"{url}/v2/devices", callback=http_200_callback(body=devices))
+    responses.add_callback(responses.POST, f"{url}/v2/assignments/request", callback=http_202_callback())
+
+    # When
+    response = Devices(session, url, customer_id=customer_id, hedging_policy=hedging_policy).all()
+    Assignment(
+        session,
+        url,
+        customer_id=customer_id,
+        employee_ids=employee_ids,
+        hedging_policy=hedging_policy,
+    ).request()
+
+    # Then
+    assert response.dumps() == DevicesResponse.load(devices).dumps()
+    assert hedging_policy.stats()["requests"] == 1
+    hedging_policy.close()
+
+
+@responses.activate
+def test_execute_query_timeout(url, customer_id):
+    # Given
+    session = Session()
+    devices_query = Devices(session, url, customer_id=customer_id, timeout=(1, 2))
+    responses.add(responses.GET, f"{url}/v2/devices", body=ReadTimeout("read timed out"))
+
+    # When/Then
+    with pytest.raises(RequestTimeoutError) as err_info:
+        devices_query.all()
+
+    assert devices_query.timeout == (1, 2)
+    assert "/v2/devices" in str(err_info.value)
+    assert not isinstance(err_info.value, DeadlineExceededError)
+
+
+@responses.activate
+def test_devices_pages(url, customer_id, devices):
+    # Given
+    session = Session()
+    devices_query = Devices(session, url, customer_id=customer_id).limit(1)
+    expected_url = f"{url}/v2/devices"
+    responses.add_callback(responses.GET, expected_url, callback=http_200_callback(body=dict(devices, after="next")))
+    responses.add_callback(responses.GET, expected_url, callback=http_200_callback(body=devices))
+
+    # When
+    pages = list(devices_query.pages())
+
+    # Then
+    assert [page.after for page in pages] == ["next", None]
+    assert "after=next" in responses.calls[1].request.url
+
+
+@responses.activate
+def test_devices_pages_deadline(url, customer_id, devices, clock):
+    # Given
+    session = Session()
+    devices_query = Devices(session, url, customer_id=customer_id).deadline(Deadline(5, clock=clock))
+
+    def slow_page(request):
+        clock.advance(3)
+        return http_200_callback(body=dict(devices, after="next"))(request)
+
+    responses.add_callback(responses.GET, f"{url}/v2/devices", callback=slow_page)
+
+    # When/Then
+    with pytest.raises(DeadlineExceededError):
+        for _ in devices_query.pages():
+            pass
+
+    assert len(responses.calls) == 2
+
+
+@responses.activate
+def test_devices_pages_tracing(url, customer_id, devices):
+    # Given
+    tracer = RecordingTracer()
+    devices_query = Devices(Session(), url, customer_id=customer_id, tracer=tracer)
+    expected_url = f"{url}/v2/devices"
+    responses.add_callback(responses.GET, expected_url, callback=http_200_callback(body=dict(devices, after="next")))
+    responses.add_callback(responses.GET, expected_url, callback=http_200_callback(body=devices))
+
+    # When
+    list(devices_query.pages())
+
+    # Then every page is a child of the iteration, each request a child of its page
+    spans = {span.span_id: span for span in tracer.spans}
+    [root] = [span for span in spans.values() if span.parent is None]
+    assert root.name == "devices.pages" and root.attributes["devices.pages"] == 2
+    pages = [span for span in tracer.spans if span.name == "devices.page"]
+    assert [page.parent for page in pages] == [root, root]
+    requests = [span for span in tracer.spans if span.name == "GET /v2/devices"]
+    assert [span.parent for span in requests] == pages
+    http_spans = [span for span in tracer.spans if span.name == "HTTP GET"]
+    loads = [span for span in tracer.spans if span.name == "schema.load"]
+    assert [span.parent for span in http_spans] == [span.parent for span in loads] == requests
+    assert http_spans[0].attributes["http.status_code"] == 200
+    assert len({span.trace_id for span in spans.values()}) == 1
+    traceparents = [call.request.headers["traceparent"] for call in responses.calls]
+    assert traceparents == [span.traceparent for span in http_spans]
+
+
+@responses.activate
+def test_devices_pages_memory_per_customer(url, customer_id, devices):
+    # Given
+    metrics = Metrics()
+    samples = []
+    expected_url = f"{url}/v2/devices"
+    responses.add_callback(responses.GET, expected_url, callback=http_200_callback(body=dict(devices, after="next")))
+    responses.add_callback(responses.GET, expected_url, callback=http_200_callback(body=devices))
+    memory_accounting = MemoryAccounting(on_sample=samples.append)
+    devices_query = Devices(
+        Session(), url, customer_id=customer_id, metrics=metrics, memory_accounting=memory_accounting
+    )
+
+    # When
+    pages = list(devices_query.pages())
+
+    # Then
+    assert pages[1].dumps() == DevicesResponse.load(devices).dumps()
+    assert [sample.customer_id for sample in samples] == [customer_id, customer_id]
+    memory = metrics.memory()[(DevicesV2Endpoint.DEVICES.value, customer_id)]
+    assert memory["pages"] == 2
+    assert memory["body_bytes"] == sum(len(call.response.content) for call in responses.calls)
+    assert memory["max_retained_bytes"] == max(sample.retained for sample in samples)
+    lines = PrometheusExporter(metrics=metrics).expose().splitlines()
+    assert f'devices_client_pages_total{{endpoint="/v2/devices",customer_id="{customer_id}"}} 2' in lines
+
+
 # Devices Scenarios
 # Scenario 01: Create Query
 # Scenario 02: Filter by
@@ -307,6 +706,48 @@ def test_device_assignment_delete(customer_id, device_id, url):
     assert device_assignment_query.host_identifier == host_identifier
 
 
+@responses.activate
+def test_device_assignment_get_not_found_is_cached(customer_id, device_id, url):
+    # Given
+    host_identifier = f"{customer_id}::{device_id}"
+    session = Session()
+    negative_cache = NegativeCache(ttl=60)
+    error_response = dict(code="not_found", detail="assignment not found", source=None)
+
+    expected_url = f"{url}/v2/devices/{host_identifier}/assignment"
+    responses.add_callback(responses.GET, expected_url, callback=http_404_callback(body=error_response))
+    responses.add_callback(responses.PUT, expected_url, callback=http_204_callback())
+
+    device_assignment_query = DeviceAssignment(
+        session,
+        url,
+        host_identifier=host_identifier,
+        negative_cache=negative_cache,
+    )
+
+    # When
+    for _ in range(3):
+        with pytest.raises(APIDevicesV2Error) as err_info:
+            device_assignment_query.get()
+
+        # Then
+        err = err_info.value
+        assert err.status_code == HTTPStatus.NOT_FOUND
+        assert err.code == "not_found"
+        assert err.detail == "assignment not found"
+
+    assert len(responses.calls) == 1
+    assert negative_cache.stats()["hits"] == 2
+
+    # When
+    device_assignment_query.create(assigned_to="someone", assigned_by="someone else")
+    with pytest.raises(APIDevicesV2Error):
+        device_assignment_query.get()
+
+    # Then
+    assert len(responses.calls) == 3
+
+
 # Scenarios for MDM
 # Scenario 01: MDM create Query
 # Scenario 02: Get MDM success
@@ -595,6 +1036,18 @@ class SomeResource(Query):  # pylint: disable=too-few-public-methods
     """
 
 
+class TokenProvider:
+
+    def __init__(self, tokens):
+        self._tokens = iter(tokens)
+        self.token = next(self._tokens)
+        self.invalidated = []
+
+    def invalidate(self, stale_token=None):
+        self.invalidated.append(stale_token)
+        self.token = next(self._tokens)
+
+
 @pytest.fixture(name="url")
 def get_url():
     return "http://someurlrandom.com.ar"